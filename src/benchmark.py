@@ -0,0 +1,349 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import os
+import gc
+import sys
+import json
+import time
+import types
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import socketserver
+import tracemalloc
+import urllib.request
+import http.server
+
+from types import SimpleNamespace
+
+from series import (
+    SeriesKeyTable,
+    SeriesLimiter,
+    OVERFLOW_POLICY_TOP_K
+)
+
+from transport import (
+    create_message_envelope,
+    IngestionTransport
+)
+
+from transform import (
+    create_node_record,
+    transform_chunk,
+    pack_monitoring_items,
+    TransformWorkerPool
+)
+
+from streaming import stream_monitoring_data
+from throttle import split_by_priority
+
+
+def create_monitoring_items(nodes: int, measurables: int) -> list:
+    now = int(time.time()) * 1000
+
+    items = []
+    for entity in range(1, nodes + 1):
+        for measurable in range(1, measurables + 1):
+            if measurable % 10 == 0:
+                value = random.choice(['PASS', 'FAIL'])
+            else:
+                value = random.random() * 100
+
+            items.append({'entity': entity, 'measurable': measurable, 'value': value, 't0': now, 't1': now})
+
+    return items
+
+
+def create_transform_context(measurables: int) -> tuple:
+    series_table = SeriesKeyTable()
+
+    measurable_series = dict()
+    for measurable in range(1, measurables + 1):
+        name = 'Metric{0}'.format(measurable)
+        measurable_series[measurable] = (series_table.intern(name), name)
+
+    return 1, 0, '00000000-0000-0000-0000-000000000000', time.time(), series_table.snapshot(), \
+        measurable_series, None, OVERFLOW_POLICY_TOP_K, dict()
+
+
+def benchmark_transform(arguments: argparse.Namespace) -> None:
+    items = create_monitoring_items(arguments.nodes, arguments.measurables)
+    context = create_transform_context(arguments.measurables)
+
+    per_chunk = arguments.chunk_size * arguments.measurables
+    chunks = []
+    for start in range(0, len(items), per_chunk):
+        first_node = start // arguments.measurables + 1
+        headers = tuple(
+            (entity, 'node{0:05d}'.format(entity), 'NA')
+            for entity in range(first_node, min(first_node + arguments.chunk_size, arguments.nodes + 1))
+        )
+        chunks.append((headers, items[start:start + per_chunk]))
+
+    start_time = time.time()
+    for headers, chunk in chunks:
+        transform_chunk(context, headers, pack_monitoring_items(chunk))
+    baseline = time.time() - start_time
+
+    print('{0} nodes x {1} measurables, {2} chunks'.format(arguments.nodes, arguments.measurables, len(chunks)))
+    print('{0:>8} {1:>10} {2:>8}'.format('workers', 'seconds', 'speedup'))
+    print('{0:>8} {1:>10.3f} {2:>8.2f}'.format('inline', baseline, 1.0))
+
+    workers = 1
+    while workers <= arguments.max_workers:
+        pool = TransformWorkerPool(workers)
+
+        # warm up the workers so process start up and loading the context are not measured
+        pool.publish(context)
+        for result in [pool.submit(context[0], (), pack_monitoring_items(())) for _ in range(workers * 4)]:
+            result.get()
+
+        start_time = time.time()
+        pending = [pool.submit(context[0], headers, pack_monitoring_items(chunk)) for headers, chunk in chunks]
+        for result in pending:
+            result.get()
+        elapsed = time.time() - start_time
+
+        pool.close()
+
+        print('{0:>8} {1:>10.3f} {2:>8.2f}'.format(workers, elapsed, baseline / elapsed))
+        workers *= 2
+
+
+def install_pythoncm_stand_ins() -> None:
+    """Registers placeholder pythoncm entity modules unless pythoncm is installed.
+
+    classes.py only uses the pythoncm entity types in annotations, the placeholders let the connector's
+    own entity wrappers and replay cluster run on machines without pythoncm.
+    """
+    try:
+        import pythoncm  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    for module_name, class_name in [('pythoncm', None),
+                                    ('pythoncm.entity', None),
+                                    ('pythoncm.entity.metadata', None),
+                                    ('pythoncm.entity.entity', 'Entity'),
+                                    ('pythoncm.entity.node', 'Node'),
+                                    ('pythoncm.entity.monitoringmeasurablemetric', 'MonitoringMeasurableMetric'),
+                                    ('pythoncm.entity.metadata.powerstatus', 'PowerStatus'),
+                                    ('pythoncm.entity.devstatus', 'DevStatus')]:
+        module = types.ModuleType(module_name)
+        if class_name is None:
+            module.__path__ = []
+        else:
+            setattr(module, class_name, type(class_name, (object,), dict()))
+
+        sys.modules[module_name] = module
+
+
+def measure_peak_memory(target) -> int:
+    gc.collect()
+
+    tracemalloc.start()
+    try:
+        target()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_memory(arguments: argparse.Namespace) -> None:
+    install_pythoncm_stand_ins()
+
+    # imported once the stand-ins are in place, both need pythoncm
+    from classes import (
+        BrightNode,
+        BrightMeasurable
+    )
+
+    from replay import (
+        MonitoringRecorder,
+        ReplayBrightCluster
+    )
+
+    instrumentation_key = '00000000-0000-0000-0000-000000000000'
+    series_limiter = SeriesLimiter()
+
+    # the record path of an emit cycle with TransformWorkers at 0, up to handing the envelopes to the transport
+    def emit(bright_cluster: ReplayBrightCluster, nodes: dict, measurables: dict, series_ids: dict,
+             series_table: SeriesKeyTable, chunk_size: int) -> None:
+        for bright_node, monitoring_items in stream_monitoring_data(bright_cluster, nodes, measurables, 5, chunk_size):
+            node_metric_data, _ = create_node_record(bright_node, monitoring_items, measurables, series_ids,
+                                                     series_table, series_limiter)
+
+            for _, record in split_by_priority(node_metric_data, dict()):
+                create_message_envelope(instrumentation_key, json.dumps(record)).encode('utf-8')
+
+    print('{0} measurables per node, {1} nodes per streamed chunk'.format(arguments.measurables, arguments.chunk_size))
+    print('{0:>8} {1:>20} {2:>20}'.format('nodes', 'materialized peak MB', 'streamed peak MB'))
+
+    capture_directory = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        nodes = arguments.nodes
+        while nodes <= arguments.max_nodes:
+            # a capture of one cycle, replayed like a head node answering each request
+            capture_filepath = os.path.join(capture_directory, 'memory-{0}.jsonl'.format(nodes))
+            recorder = MonitoringRecorder(capture_filepath)
+
+            recorded_nodes = {
+                unique_key: BrightNode(SimpleNamespace(uniqueKey=unique_key, hostname='node{0:05d}'.format(unique_key),
+                                                       rack=None, category='compute'))
+                for unique_key in range(1, nodes + 1)
+            }
+            recorded_measurables = {
+                unique_key: BrightMeasurable(SimpleNamespace(uniqueKey=unique_key, name='Metric{0}'.format(unique_key),
+                                                             parameter=None, typeClass='Metric'))
+                for unique_key in range(1, arguments.measurables + 1)
+            }
+
+            recorder.record_nodes(recorded_nodes)
+            recorder.record_measurables(recorded_measurables)
+            recorder.record_monitoring_data('get_latest_monitoring_data', recorded_nodes, recorded_measurables,
+                                            create_monitoring_items(nodes, arguments.measurables))
+
+            bright_cluster = ReplayBrightCluster(capture_filepath, 0)
+            cluster_nodes = bright_cluster.get_nodes()
+            measurables = bright_cluster.get_measurables()
+
+            series_table = SeriesKeyTable()
+            series_ids = {
+                measurable_key: series_table.intern(measurable.name, measurable.parameter)
+                for measurable_key, measurable in measurables.items()
+            }
+
+            # a chunk spanning every node is the whole response at once
+            peaks = [
+                measure_peak_memory(lambda: emit(bright_cluster, cluster_nodes, measurables, series_ids, series_table,
+                                                 chunk_size)) / (1024 * 1024)
+                for chunk_size in (nodes, arguments.chunk_size)
+            ]
+
+            print('{0:>8} {1:>20.1f} {2:>20.1f}'.format(nodes, *peaks))
+            nodes *= 2
+    finally:
+        shutil.rmtree(capture_directory, ignore_errors=True)
+
+
+class StandInIngestionHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # headers and body are written separately, keep Nagle from delaying the body on reused connections
+    disable_nagle_algorithm = True
+
+    def setup(self) -> None:
+        http.server.BaseHTTPRequestHandler.setup(self)
+
+        # every accepted connection stands for one TLS handshake against the real endpoint
+        with self.server.mutex:
+            self.server.connections += 1
+        time.sleep(self.server.handshake_delay)
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        body = b'{"itemsReceived": 1, "itemsAccepted": 1, "errors": []}'
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class StandInIngestionServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handshake_delay: float):
+        http.server.HTTPServer.__init__(self, ('127.0.0.1', 0), StandInIngestionHandler)
+
+        self.handshake_delay = handshake_delay
+        self.connections = 0
+        self.mutex = threading.Lock()
+
+
+def send_without_pooling(endpoint: str, payload: bytes) -> None:
+    request = urllib.request.Request(endpoint, data=payload, method='POST',
+                                     headers={'Content-Type': 'application/x-json-stream'})
+    with urllib.request.urlopen(request) as response:
+        response.read()
+
+
+def benchmark_transport(arguments: argparse.Namespace) -> None:
+    server = StandInIngestionServer(arguments.handshake_delay / 1000.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    endpoint = 'http://127.0.0.1:{0}/v2/track'.format(server.server_address[1])
+
+    message = '{"Hostname": "node00001", "RackId": "NA", "CPUIdle": 97.5, "MemoryAvailable": 1024}'
+    payload = create_message_envelope('00000000-0000-0000-0000-000000000000', message).encode('utf-8')
+
+    transport = IngestionTransport(endpoint, pool_size=1)
+
+    print('{0} batches, {1} ms simulated handshake'.format(arguments.batches, arguments.handshake_delay))
+    print('{0:>16} {1:>12} {2:>16}'.format('transport', 'handshakes', 'ms per batch'))
+
+    for name, send in [('per-flush', lambda: send_without_pooling(endpoint, payload)),
+                       ('keep-alive', lambda: transport.send(payload))]:
+        connections = server.connections
+
+        start_time = time.time()
+        for _ in range(arguments.batches):
+            send()
+        elapsed = time.time() - start_time
+
+        print('{0:>16} {1:>12} {2:>16.3f}'.format(name, server.connections - connections,
+                                                   elapsed * 1000 / arguments.batches))
+
+    transport.close()
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='benchmark')
+
+    transform_parser = subparsers.add_parser('transform', help='transform and compression throughput per worker count')
+    transform_parser.add_argument('--nodes', type=int, default=4000, help='number of synthetic nodes')
+    transform_parser.add_argument('--measurables', type=int, default=50, help='number of measurables per node')
+    transform_parser.add_argument('--chunk-size', type=int, default=256, help='nodes per worker task')
+    transform_parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1,
+                                  help='largest worker count to measure')
+    transform_parser.set_defaults(handler=benchmark_transform)
+
+    transport_parser = subparsers.add_parser('transport', help='handshakes and latency per batch against a local '
+                                                                'stand-in endpoint')
+    transport_parser.add_argument('--batches', type=int, default=200, help='number of batches to send')
+    transport_parser.add_argument('--handshake-delay', type=float, default=20.0,
+                                  help='milliseconds added to every new connection')
+    transport_parser.set_defaults(handler=benchmark_transport)
+
+    memory_parser = subparsers.add_parser('memory', help='peak memory of building node records, whole responses '
+                                                          'versus streamed chunks')
+    memory_parser.add_argument('--nodes', type=int, default=500, help='smallest number of synthetic nodes')
+    memory_parser.add_argument('--max-nodes', type=int, default=8000, help='largest number of synthetic nodes')
+    memory_parser.add_argument('--measurables', type=int, default=50, help='number of measurables per node')
+    memory_parser.add_argument('--chunk-size', type=int, default=256, help='nodes requested per streamed chunk')
+    memory_parser.set_defaults(handler=benchmark_memory)
+
+    arguments = parser.parse_args()
+
+    if getattr(arguments, 'handler', None) is None:
+        parser.print_help()
+    else:
+        arguments.handler(arguments)
+
+
+if __name__ == '__main__':
+    main()
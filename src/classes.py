@@ -17,6 +17,8 @@ from pythoncm.entity.monitoringmeasurablemetric import MonitoringMeasurableMetri
 from pythoncm.entity.metadata.powerstatus import PowerStatus
 from pythoncm.entity.devstatus import DevStatus
 
+from values import normalize_monitoring_value
+
 
 __all__ = [
     'BrightEntity',
@@ -68,6 +70,26 @@ class BrightNode(BrightEntity):
         else:
             return getattr(raw_entity, 'rack', 'NA')
 
+    @property
+    def rack_name(self) -> str:
+        raw_entity = self.get_raw_entity()
+        rack = getattr(raw_entity, 'rack', None)
+
+        if rack is None:
+            return 'NA'
+        else:
+            return getattr(rack, 'name', rack)
+
+    @property
+    def category(self) -> str:
+        raw_entity = self.get_raw_entity()
+        category = getattr(raw_entity, 'category', None)
+
+        if category is None:
+            return 'NA'
+        else:
+            return getattr(category, 'name', category)
+
     @property
     def interfaces(self) -> Optional[dict]:
         raw_entity = self.get_raw_entity()
@@ -112,6 +134,24 @@ class BrightMeasurable(BrightEntity):
         raw_entity = self.get_raw_entity()
         return getattr(raw_entity, 'typeClass', None)
 
+    @property
+    def producer(self) -> Optional[str]:
+        raw_entity = self.get_raw_entity()
+        value = getattr(raw_entity, 'producer', None)
+
+        # producers come either resolved to their entity or as a plain name
+        return getattr(value, 'name', value)
+
+    @property
+    def sampling_interval(self) -> Optional[int]:
+        raw_entity = self.get_raw_entity()
+        value = getattr(raw_entity, 'interval', None)
+
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            return None
+        else:
+            return int(value)
+
 
 class BrightPowerStatus(BrightEntity):
     def __init__(self, power_status: PowerStatus):
@@ -212,23 +252,7 @@ class BrightEntityMonitoringItem(object):
 
     @property
     def value(self) -> Optional[Union[int, float]]:
-        value = self.__monitoring_item.get('value', None)
-
-        if isinstance(value, bool):
-            return 1 if value else 0
-        elif isinstance(value, str):
-            value = value.upper()
-
-            if value in {'PASS', 'TRUE', 'ON', 'UP'}:
-                return 1
-            elif value in {'FAIL', 'FALSE', 'OFF', 'DOWN'}:
-                return 0
-            else:
-                return None
-        elif isinstance(value, int) or isinstance(value, float):
-            return value
-        else:
-            return None
+        return normalize_monitoring_value(self.__monitoring_item.get('value', None))
 
     @property
     def t0(self) -> int:
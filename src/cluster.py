@@ -8,7 +8,10 @@ import os
 import six
 import time
 
-from typing import Iterable
+from typing import (
+    Iterable,
+    Optional
+)
 
 import pythoncm
 
@@ -17,8 +20,12 @@ from pythoncm.settings import Settings
 
 from pythoncm.entity.node import Node
 from pythoncm.entity.monitoringmeasurablemetric import MonitoringMeasurableMetric
+from pythoncm.entity.monitoringdataproducer import MonitoringDataProducer
 
 from exceptions import BrightClusterConnectionError
+from replay import MonitoringRecorder
+from planner import observe_oldest_samples
+from events import BrightEventSource
 
 from classes import (
     BrightNode,
@@ -34,10 +41,11 @@ __all__ = [
 
 
 class BrightCluster(object):
-    def __init__(self, host_ip: str, cert_filepath: str, key_filepath: str):
+    def __init__(self, host_ip: str, cert_filepath: str, key_filepath: str, recorder: MonitoringRecorder = None):
         self.__set_host_ip(host_ip)
         self.__set_cert_filepath(cert_filepath)
         self.__set_key_filepath(key_filepath)
+        self.__set_recorder(recorder)
 
         settings = self.__create_settings()
         self.__set_settings(settings)
@@ -63,6 +71,12 @@ class BrightCluster(object):
     def __set_key_filepath(self, key_filepath: str) -> None:
         self.__key_filepath = key_filepath
 
+    def __get_recorder(self) -> Optional[MonitoringRecorder]:
+        return self.__recorder
+
+    def __set_recorder(self, recorder: Optional[MonitoringRecorder]) -> None:
+        self.__recorder = recorder
+
     def __get_settings(self) -> Settings:
         return self.__settings
 
@@ -125,6 +139,10 @@ class BrightCluster(object):
 
         return entities
 
+    def get_event_source(self) -> BrightEventSource:
+        cluster = self.__get_cluster()
+        return BrightEventSource(cluster)
+
     def get_nodes(self, keywords: Iterable[str] = None) -> dict:
         nodes = self.__entities_lookup(keywords=keywords, instances=[Node])
 
@@ -133,6 +151,10 @@ class BrightCluster(object):
             bright_node = BrightNode(node)
             result[bright_node.unique_key] = bright_node
 
+        recorder = self.__get_recorder()
+        if recorder is not None:
+            recorder.record_nodes(result)
+
         return result
 
     def get_measurables(self, keywords: Iterable[str] = None) -> dict:
@@ -143,6 +165,33 @@ class BrightCluster(object):
             bright_measurable = BrightMeasurable(measurable)
             result[bright_measurable.unique_key] = bright_measurable
 
+        recorder = self.__get_recorder()
+        if recorder is not None:
+            recorder.record_measurables(result)
+
+        return result
+
+    def get_sampling_intervals(self, measurables: dict) -> dict:
+        producers = self.__entities_lookup(instances=[MonitoringDataProducer])
+
+        producer_intervals = dict()
+        for producer in producers:
+            interval = getattr(producer, 'interval', None)
+            if isinstance(interval, (int, float)) and interval > 0:
+                producer_intervals[getattr(producer, 'name', None)] = int(interval)
+
+        # an interval set on the measurable itself wins over the one of its producer
+        result = dict()
+        for measurable_key, bright_measurable in measurables.items():
+            sampling_interval = bright_measurable.sampling_interval
+            if sampling_interval is None:
+                sampling_interval = producer_intervals.get(bright_measurable.producer)
+            result[measurable_key] = sampling_interval
+
+        recorder = self.__get_recorder()
+        if recorder is not None:
+            recorder.record_sampling_intervals(result)
+
         return result
 
     def get_latest_monitoring_data(self, entities: dict, measurables: dict) -> dict:
@@ -157,6 +206,10 @@ class BrightCluster(object):
         except AttributeError:
             return dict()
 
+        recorder = self.__get_recorder()
+        if recorder is not None:
+            recorder.record_monitoring_data('get_latest_monitoring_data', entities, measurables, monitoring_data)
+
         result = dict()
         for item in monitoring_data:
             bright_monitoring_item = BrightEntityMonitoringItem(item)
@@ -176,6 +229,10 @@ class BrightCluster(object):
         except AttributeError:
             return dict()
 
+        recorder = self.__get_recorder()
+        if recorder is not None:
+            recorder.record_monitoring_data('dump_monitoring_data', entities, measurables, monitoring_data)
+
         result = dict()
         for item in monitoring_data:
             bright_monitoring_item = BrightEntityMonitoringItem(item)
@@ -194,6 +251,10 @@ class BrightCluster(object):
         except AttributeError:
             return dict()
 
+        recorder = self.__get_recorder()
+        if recorder is not None:
+            recorder.record_monitoring_data('sample_now', entities, measurables, monitoring_data)
+
         result = dict()
         for item in monitoring_data:
             bright_monitoring_item = BrightEntityMonitoringItem(item)
@@ -201,7 +262,8 @@ class BrightCluster(object):
 
         return result
 
-    def get_monitoring_data(self, entities: dict, measurables: dict, interval: int) -> dict:
+    def get_monitoring_data(self, entities: dict, measurables: dict, interval: int,
+                            oldest_samples: dict = None) -> dict:
         raw_entity = [entity.get_raw_entity() for entity in entities.values()]
         raw_measurables = [measurable.get_raw_entity() for measurable in measurables.values()]
 
@@ -213,18 +275,54 @@ class BrightCluster(object):
         except AttributeError:
             return dict()
 
+        recorder = self.__get_recorder()
+        if recorder is not None:
+            recorder.record_monitoring_data('get_latest_monitoring_data', entities, measurables, monitoring_data)
+
+        cutoff = (int(time.time()) - (interval * 60)) * 1000
+
+        if oldest_samples is not None:
+            observe_oldest_samples(monitoring_data, oldest_samples, cutoff)
+
+        # stale samples are dropped before they are wrapped
         result = dict()
         for item in monitoring_data:
+            if item.get('t1', 0) < cutoff:
+                continue
+
             bright_monitoring_item = BrightEntityMonitoringItem(item)
-            if bright_monitoring_item.t1 >= (int(time.time()) - (interval * 60)) * 1000:
-                result.setdefault(bright_monitoring_item.entity, []).append(bright_monitoring_item)
+            result.setdefault(bright_monitoring_item.entity, []).append(bright_monitoring_item)
 
         return result
 
+    def get_raw_monitoring_data(self, entities: dict, measurables: dict) -> list:
+        raw_entity = [entity.get_raw_entity() for entity in entities.values()]
+        raw_measurables = [measurable.get_raw_entity() for measurable in measurables.values()]
+
+        cluster = self.__get_cluster()
+
+        try:
+            monitoring_data = cluster.monitoring.get_latest_monitoring_data(raw_entity, raw_measurables).raw.get(
+                'items', list())
+        except AttributeError:
+            return list()
+
+        recorder = self.__get_recorder()
+        if recorder is not None:
+            recorder.record_monitoring_data('get_latest_monitoring_data', entities, measurables, monitoring_data)
+
+        return monitoring_data
+
     def get_power_status(self, devices: dict) -> dict:
+        raw_devices = [device.get_raw_entity() for device in devices.values()]
+
         cluster = self.__get_cluster()
 
-        power_status = cluster.parallel.power_status(devices)
+        power_status = cluster.parallel.power_status(raw_devices)
+
+        recorder = self.__get_recorder()
+        if recorder is not None:
+            recorder.record_power_status(devices, power_status)
 
         if len(power_status) == 2:
             if power_status[0]:
@@ -241,9 +339,15 @@ class BrightCluster(object):
             return dict()
 
     def get_device_status(self, devices: dict) -> dict:
+        raw_devices = [device.get_raw_entity() for device in devices.values()]
+
         cluster = self.__get_cluster()
 
-        device_status = cluster.parallel.device_status(devices)
+        device_status = cluster.parallel.device_status(raw_devices)
+
+        recorder = self.__get_recorder()
+        if recorder is not None:
+            recorder.record_device_status(devices, device_status)
 
         result = dict()
         for item in device_status:
@@ -5,8 +5,14 @@
 
 
 __all__ = [
-    'WORKINGDIR'
+    'WORKINGDIR',
+    'PROFILEDIR',
+    'PROFILE_FLAG_FILEPATH'
 ]
 
 
 WORKINGDIR = r'/Workspace/Bright-AppInsights-Monitoring-Connector/'
+
+# profiles written by CycleProfiler, creating the flag file profiles the next cycles
+PROFILEDIR = WORKINGDIR + r'profiles/'
+PROFILE_FLAG_FILEPATH = WORKINGDIR + r'profile.flag'
@@ -7,22 +7,81 @@
 import os
 import time
 import json
-import logging
+import functools
 import threading
+import collections
+import multiprocessing
 
-from typing import Iterable
-from applicationinsights.logging import LoggingHandler
+from typing import (
+    Callable,
+    Iterable,
+    Optional
+)
 
 from cluster import BrightCluster
+from pipeline import EmitPipeline
+from classes import BrightEntityMonitoringItem
+
+from replay import (
+    MonitoringRecorder,
+    ReplayBrightCluster
+)
+
+from transport import (
+    create_message_envelope,
+    IngestionTransport
+)
+
+from transform import (
+    create_node_record,
+    pack_monitoring_items,
+    TransformWorkerPool
+)
+
+from series import (
+    SeriesKeyTable,
+    SeriesLimiter
+)
+
+from settings import ConnectorSettings
+from streaming import stream_monitoring_data
+from selection import NodeSelector
+from profiler import (
+    ProfileSession,
+    CycleProfiler
+)
+
+from planner import (
+    observe_oldest_samples,
+    FetchPlanner
+)
+
+from events import (
+    COLLECTION_MODE_PUSH,
+    PushCollector
+)
+
+from throttle import (
+    PRIORITIES,
+    split_by_priority,
+    IngestionThrottle
+)
 
 from exceptions import (
     EmitMetricsTimeoutError,
-    RefreshClusterTimeoutError
+    RefreshClusterTimeoutError,
+    IngestionTransportError,
+    IngestionUnavailableError,
+    IngestionPartialDeliveryError
 )
 
 from logger import TraceLogger
 
-from constants import WORKINGDIR
+from constants import (
+    WORKINGDIR,
+    PROFILEDIR,
+    PROFILE_FLAG_FILEPATH
+)
 
 
 __all__ = [
@@ -31,22 +90,61 @@ __all__ = [
 
 
 class ApplicationInsightsEmitter(object):
-    def __init__(self, bright_host_ip: str, metrics: Iterable[str], instrumentation_key: str):
+    def __init__(self, bright_host_ip: str, metrics: Iterable[str], instrumentation_key: str,
+                 settings: ConnectorSettings = None, metric_priorities: dict = None,
+                 profiler: CycleProfiler = None):
         self.__set_bright_host_ip(bright_host_ip)
         self.__set_metrics(metrics)
         self.__set_instrumentation_key(instrumentation_key)
+        self.__set_settings(settings if settings is not None else ConnectorSettings())
+        self.__set_metric_priorities(metric_priorities if metric_priorities is not None else dict())
+        self.__set_profiler(profiler if profiler is not None else self.__create_profiler())
+
+        recorder = self.__create_recorder()
+        self.__set_recorder(recorder)
+
+        replay_cluster = self.__create_replay_cluster()
+        self.__set_replay_cluster(replay_cluster)
 
         bright_cluster = self.__create_bright_cluster()
         self.__set_bright_cluster(bright_cluster)
 
-        emit_handler = LoggingHandler(instrumentation_key)
-        emit_handler.setLevel(logging.DEBUG)
-        self.__set_emit_handler(emit_handler)
+        node_selector = NodeSelector(self.__get_settings().node_filters)
+        self.__set_node_selector(node_selector)
+
+        selected_nodes = self.__select_nodes(bright_cluster)
+        self.__set_selected_nodes(selected_nodes)
 
-        emitter = logging.getLogger('application-insights')
-        emitter.setLevel(logging.DEBUG)
-        emitter.addHandler(emit_handler)
-        self.__set_emitter(emitter)
+        push_collector = self.__create_push_collector(bright_cluster)
+        self.__set_push_collector(push_collector)
+
+        # (nodes, measurables, series ids, series table) of the last emit cycle, used to send pushed samples
+        self.__set_push_context(None)
+
+        series_table = self.__create_series_table()
+        self.__set_series_table(series_table)
+
+        series_limiter = self.__create_series_limiter()
+        self.__set_series_limiter(series_limiter)
+
+        # planning is opt-in, without it every cycle requests all measurables
+        self.__set_fetch_planner(FetchPlanner() if self.__get_settings().fetch_planning else None)
+
+        throttle = self.__create_throttle()
+        self.__set_throttle(throttle)
+
+        transport = self.__create_transport()
+        self.__set_transport(transport)
+
+        # payloads turned away by the throttle, retried at the end of every emit cycle
+        self.__set_deferred({priority: collections.deque() for priority in PRIORITIES})
+        self.__set_deferred_mutex(threading.Lock())
+
+        # transforming in worker processes is opt-in, threads are enough for most clusters
+        transform_workers = self.__get_settings().transform_workers
+        self.__set_transform_pool(TransformWorkerPool(transform_workers) if transform_workers else None)
+
+        self.__set_cycle(0)
 
         mutex = threading.Lock()
         self.__set_mutex(mutex)
@@ -69,23 +167,119 @@ class ApplicationInsightsEmitter(object):
     def __set_instrumentation_key(self, instrumentation_key):
         self.__instrumentation_key = instrumentation_key
 
+    def __get_settings(self) -> ConnectorSettings:
+        return self.__settings
+
+    def __set_settings(self, settings: ConnectorSettings) -> None:
+        self.__settings = settings
+
+    def __get_metric_priorities(self) -> dict:
+        return self.__metric_priorities
+
+    def __set_metric_priorities(self, metric_priorities: dict) -> None:
+        self.__metric_priorities = metric_priorities
+
+    def __get_profiler(self) -> CycleProfiler:
+        return self.__profiler
+
+    def __set_profiler(self, profiler: CycleProfiler) -> None:
+        self.__profiler = profiler
+
+    def __get_recorder(self) -> Optional[MonitoringRecorder]:
+        return self.__recorder
+
+    def __set_recorder(self, recorder: Optional[MonitoringRecorder]) -> None:
+        self.__recorder = recorder
+
+    def __get_replay_cluster(self) -> Optional[ReplayBrightCluster]:
+        return self.__replay_cluster
+
+    def __set_replay_cluster(self, replay_cluster: Optional[ReplayBrightCluster]) -> None:
+        self.__replay_cluster = replay_cluster
+
     def __get_bright_cluster(self) -> BrightCluster:
         return self.__bright_cluster
 
     def __set_bright_cluster(self, bright_cluster: BrightCluster) -> None:
         self.__bright_cluster = bright_cluster
 
-    def __get_emit_handler(self):
-        return self.__emit_handler
+    def __get_node_selector(self) -> NodeSelector:
+        return self.__node_selector
+
+    def __set_node_selector(self, node_selector: NodeSelector) -> None:
+        self.__node_selector = node_selector
 
-    def __set_emit_handler(self, emit_handler):
-        self.__emit_handler = emit_handler
+    def __get_selected_nodes(self) -> Optional[set]:
+        return self.__selected_nodes
 
-    def __get_emitter(self):
-        return self.__emitter
+    def __set_selected_nodes(self, selected_nodes: Optional[set]) -> None:
+        self.__selected_nodes = selected_nodes
 
-    def __set_emitter(self, emitter):
-        self.__emitter = emitter
+    def __get_push_collector(self) -> Optional[PushCollector]:
+        return self.__push_collector
+
+    def __set_push_collector(self, push_collector: Optional[PushCollector]) -> None:
+        self.__push_collector = push_collector
+
+    def __get_push_context(self) -> Optional[tuple]:
+        return self.__push_context
+
+    def __set_push_context(self, push_context: Optional[tuple]) -> None:
+        self.__push_context = push_context
+
+    def __get_series_table(self) -> SeriesKeyTable:
+        return self.__series_table
+
+    def __set_series_table(self, series_table: SeriesKeyTable) -> None:
+        self.__series_table = series_table
+
+    def __get_series_limiter(self) -> SeriesLimiter:
+        return self.__series_limiter
+
+    def __set_series_limiter(self, series_limiter: SeriesLimiter) -> None:
+        self.__series_limiter = series_limiter
+
+    def __get_fetch_planner(self) -> Optional[FetchPlanner]:
+        return self.__fetch_planner
+
+    def __set_fetch_planner(self, fetch_planner: Optional[FetchPlanner]) -> None:
+        self.__fetch_planner = fetch_planner
+
+    def __get_throttle(self) -> IngestionThrottle:
+        return self.__throttle
+
+    def __set_throttle(self, throttle: IngestionThrottle) -> None:
+        self.__throttle = throttle
+
+    def __get_deferred(self) -> dict:
+        return self.__deferred
+
+    def __set_deferred(self, deferred: dict) -> None:
+        self.__deferred = deferred
+
+    def __get_deferred_mutex(self) -> threading.Lock:
+        return self.__deferred_mutex
+
+    def __set_deferred_mutex(self, deferred_mutex: threading.Lock) -> None:
+        self.__deferred_mutex = deferred_mutex
+
+    def __get_transport(self) -> IngestionTransport:
+        return self.__transport
+
+    def __set_transport(self, transport: IngestionTransport) -> None:
+        self.__transport = transport
+
+    def __get_transform_pool(self) -> Optional[TransformWorkerPool]:
+        return self.__transform_pool
+
+    def __set_transform_pool(self, transform_pool: Optional[TransformWorkerPool]) -> None:
+        self.__transform_pool = transform_pool
+
+    def __get_cycle(self) -> int:
+        return self.__cycle
+
+    def __set_cycle(self, cycle: int) -> None:
+        self.__cycle = cycle
 
     def __get_mutex(self) -> threading.Lock:
         return self.__mutex
@@ -93,85 +287,548 @@ class ApplicationInsightsEmitter(object):
     def __set_mutex(self, mutex: threading.Lock) -> None:
         self.__mutex = mutex
 
+    def __create_profiler(self) -> CycleProfiler:
+        settings = self.__get_settings()
+
+        return CycleProfiler(PROFILEDIR, PROFILE_FLAG_FILEPATH, settings.profile_cycles, settings.profile_top)
+
+    def __create_recorder(self) -> Optional[MonitoringRecorder]:
+        record_file = self.__get_settings().record_file
+
+        if record_file is None:
+            return None
+        else:
+            return MonitoringRecorder(os.path.join(WORKINGDIR, record_file))
+
+    def __create_replay_cluster(self) -> Optional[ReplayBrightCluster]:
+        settings = self.__get_settings()
+
+        if settings.replay_file is None:
+            return None
+        else:
+            return ReplayBrightCluster(os.path.join(WORKINGDIR, settings.replay_file), settings.replay_speed)
+
     def __create_bright_cluster(self) -> BrightCluster:
+        # replays keep their position across cluster refreshes
+        replay_cluster = self.__get_replay_cluster()
+        if replay_cluster is not None:
+            return replay_cluster
+
         bright_host_ip = self.__get_bright_host_ip()
 
         bright_cert_filepath = os.path.join(WORKINGDIR, r'certs/bright-cert.pem')
         bright_key_filepath = os.path.join(WORKINGDIR, r'certs/bright-key.key')
 
-        return BrightCluster(bright_host_ip, bright_cert_filepath, bright_key_filepath)
+        return BrightCluster(bright_host_ip, bright_cert_filepath, bright_key_filepath, self.__get_recorder())
+
+    def __create_transport(self) -> IngestionTransport:
+        settings = self.__get_settings()
+
+        # every sender keeps its connection alive between sends
+        return IngestionTransport(settings.ingestion_endpoint, pool_size=settings.sender_workers,
+                                  compress=settings.ingestion_compression, throttle=self.__get_throttle())
+
+    def __create_throttle(self) -> IngestionThrottle:
+        settings = self.__get_settings()
+        return IngestionThrottle(settings.ingestion_items_per_second, settings.ingestion_bytes_per_second)
+
+    def __select_nodes(self, bright_cluster: BrightCluster) -> Optional[set]:
+        node_selector = self.__get_node_selector()
+
+        if not node_selector.active:
+            return None
+
+        nodes = bright_cluster.get_nodes()
+        power_status = bright_cluster.get_power_status(nodes) if node_selector.requires_power_status else None
+
+        selected_nodes = set(node_selector.select(nodes, power_status).keys())
+
+        TraceLogger.info('Node Selection - {0} of {1} nodes selected'.format(len(selected_nodes), len(nodes)))
+
+        return selected_nodes
+
+    def __create_push_collector(self, bright_cluster: BrightCluster) -> Optional[PushCollector]:
+        if self.__get_settings().collection_mode != COLLECTION_MODE_PUSH:
+            return None
+
+        event_source = bright_cluster.get_event_source()
+        if not event_source.supported:
+            TraceLogger.warning('Push Metrics - Event stream is not supported by pythoncm, polling only')
+            return None
+
+        push_collector = PushCollector()
+        push_collector.attach(event_source)
+
+        return push_collector
+
+    def __restart_transform_pool(self) -> None:
+        transform_pool = self.__get_transform_pool()
+        if transform_pool is None:
+            return
+
+        self.__set_transform_pool(TransformWorkerPool(self.__get_settings().transform_workers))
+        transform_pool.close(terminate=True)
+
+    def __create_series_table(self) -> SeriesKeyTable:
+        settings = self.__get_settings()
+        return SeriesKeyTable(settings.max_series_total)
+
+    def __create_series_limiter(self) -> SeriesLimiter:
+        settings = self.__get_settings()
+        return SeriesLimiter(settings.max_series_per_node, settings.series_overflow_policy)
+
+    @staticmethod
+    def __shard_nodes(nodes: dict, shards: int) -> list:
+        items = list(nodes.items())
+        shards = max(1, min(shards, len(items)))
+
+        return [dict(items[index::shards]) for index in range(shards)]
+
+    @classmethod
+    def __create_fetchers(cls, fetch: Callable, nodes: dict, shards: int, shard_samples: Optional[list]) -> list:
+        # every shard observes sample times into a dict of its own, they are merged once the pipeline is done
+        fetchers = []
+        for shard in cls.__shard_nodes(nodes, shards):
+            oldest_samples = None
+            if shard_samples is not None:
+                oldest_samples = dict()
+                shard_samples.append(oldest_samples)
+
+            fetchers.append(functools.partial(fetch, shard, oldest_samples))
+
+        return fetchers
+
+    @staticmethod
+    def __shard_chunks(nodes: dict, size: int) -> list:
+        items = list(nodes.items())
+        return [dict(items[index:index + size]) for index in range(0, len(items), size)]
+
+    def __defer(self, priority: str, payload: bytes, items: int, content_encoding: Optional[str]) -> None:
+        throttle = self.__get_throttle()
+        deferred = self.__get_deferred()
+
+        with self.__get_deferred_mutex():
+            if sum(len(queued) for queued in deferred.values()) >= self.__get_settings().deferred_queue_size:
+                # make room by dropping the oldest payload of the least important class below this one
+                rank = PRIORITIES.index(priority)
+                victims = [queued for queued in deferred.values() if queued][::-1]
+                victims = [queued for queued in victims if PRIORITIES.index(queued[0][0]) > rank]
+
+                if not victims:
+                    throttle.count(priority, 'dropped', items)
+                    return
+
+                dropped = victims[0].popleft()
+                throttle.count(dropped[0], 'dropped', dropped[2])
+
+            deferred[priority].append((priority, payload, items, content_encoding))
+            throttle.count(priority, 'deferred', items)
+
+    def __set_aside(self, priority: str, payload: bytes, items: int, content_encoding: Optional[str],
+                    defer: bool) -> None:
+        if defer:
+            self.__defer(priority, payload, items, content_encoding)
+        else:
+            self.__get_throttle().count(priority, 'dropped', items)
+
+    def __deliver(self, priority: str, payload: bytes, items: int, content_encoding: Optional[str] = None,
+                  defer: bool = True) -> bool:
+        """Sends one payload, failures are counted and logged rather than ending the cycle.
+
+        Payloads the throttle or an unavailable endpoint turn away are deferred, or dropped when ``defer``
+        is off because the caller has another way to deliver them.
+        """
+        throttle = self.__get_throttle()
+        transport = self.__get_transport()
+
+        # the byte rate is charged for the request body, i.e. after compression
+        payload, content_encoding = transport.encode(payload, content_encoding)
+
+        if not throttle.acquire(priority, items, len(payload)):
+            self.__set_aside(priority, payload, items, content_encoding, defer)
+            return False
+
+        try:
+            transport.send(payload, content_encoding)
+        except IngestionPartialDeliveryError as ex:
+            # the accepted part of the payload is delivered, only the items turned away wait
+            TraceLogger.warning('Emit Metrics - {0} {1} of {2} {3} records: {4}'.format(
+                'Deferred' if defer else 'Dropped', ex.items, items, priority, ex))
+            throttle.count(priority, 'sent', items - ex.items)
+            self.__set_aside(priority, ex.payload, ex.items, content_encoding, defer)
+            return False
+        except IngestionUnavailableError as ex:
+            # the endpoint may take it later, it waits with the payloads turned away by the throttle
+            TraceLogger.warning('Emit Metrics - {0} {1} {2} records: {3}'.format(
+                'Deferred' if defer else 'Dropped', items, priority, ex))
+            self.__set_aside(priority, payload, items, content_encoding, defer)
+            return False
+        except IngestionTransportError as ex:
+            TraceLogger.error('Emit Metrics - Dropped {0} {1} records: {2}'.format(items, priority, ex))
+            throttle.count(priority, 'failed', items)
+            return False
+
+        throttle.count(priority, 'sent', items)
+        return True
+
+    def __drain_deferred(self) -> bool:
+        """Sends the most important deferred payload once the throttle admits it, False when nothing went out."""
+        throttle = self.__get_throttle()
+        transport = self.__get_transport()
+        deferred = self.__get_deferred()
+
+        with self.__get_deferred_mutex():
+            queued = [deferred[priority] for priority in PRIORITIES if deferred[priority]]
+            if not queued:
+                return False
+
+            deferred_payload = queued[0][0]
+
+        priority, payload, items, content_encoding = deferred_payload
+
+        # paced like the payloads of an emit cycle, the lock is not held while waiting for tokens
+        if not throttle.acquire(priority, items, len(payload)):
+            return False
+
+        with self.__get_deferred_mutex():
+            # evicted by a more important payload in the meantime
+            if not deferred[priority] or deferred[priority][0] is not deferred_payload:
+                return True
+
+            deferred[priority].popleft()
+
+        try:
+            transport.send(payload, content_encoding)
+        except IngestionPartialDeliveryError as ex:
+            TraceLogger.warning('Emit Metrics - Deferred payloads kept for later: {0}'.format(ex))
+            throttle.count(priority, 'sent', items - ex.items)
+            with self.__get_deferred_mutex():
+                deferred[priority].appendleft((priority, ex.payload, ex.items, content_encoding))
+            return False
+        except IngestionUnavailableError as ex:
+            # still unavailable, the payload keeps its place
+            TraceLogger.warning('Emit Metrics - Deferred payloads kept for later: {0}'.format(ex))
+            with self.__get_deferred_mutex():
+                deferred[priority].appendleft(deferred_payload)
+            return False
+        except IngestionTransportError as ex:
+            TraceLogger.error('Emit Metrics - Dropped {0} {1} records: {2}'.format(items, priority, ex))
+            throttle.count(priority, 'failed', items)
+            return True
+
+        throttle.count(priority, 'sent', items)
+        return True
+
+    def __drain_deferred_loop(self) -> None:
+        while True:
+            if not self.__drain_deferred():
+                time.sleep(1)
+
+    def __send_record(self, prioritized_record: tuple, defer: bool = True) -> bool:
+        priority, node_metric_data = prioritized_record
+
+        message = json.dumps(node_metric_data)
+
+        envelope = create_message_envelope(self.__get_instrumentation_key(), message)
+
+        return self.__deliver(priority, envelope.encode('utf-8'), 1, defer=defer)
+
+    def __create_record_transform(self, measurables: dict, series_ids: dict, series_table: SeriesKeyTable,
+                                  overflowed_series: list):
+        def transform(fetched: tuple) -> Iterable[tuple]:
+            bright_node, monitoring_items = fetched
+
+            node_metric_data, overflow_count = create_node_record(
+                bright_node, monitoring_items, measurables, series_ids, series_table, self.__get_series_limiter())
+            overflowed_series.append(overflow_count)
+
+            # important metrics of a node travel separately so they can be sent ahead of the rest
+            for prioritized_record in split_by_priority(node_metric_data, self.__get_metric_priorities()):
+                yield prioritized_record
+
+        return transform
+
+    def __create_record_stages(self, bright_cluster: BrightCluster, nodes: dict, measurables: dict, series_ids: dict,
+                               series_table: SeriesKeyTable, emit_interval: int, overflowed_series: list,
+                               requested: dict, shard_samples: Optional[list]) -> tuple:
+        settings = self.__get_settings()
+        push_collector = self.__get_push_collector()
+
+        # fetch monitoring data in background, shards run concurrently and each one is streamed chunk by chunk
+        def fetch(shard: dict, oldest_samples: Optional[dict]) -> Iterable[tuple]:
+            for bright_node, monitoring_items in stream_monitoring_data(
+                    bright_cluster, shard, requested, emit_interval, settings.transform_chunk_size, oldest_samples):
+                if push_collector is not None and monitoring_items:
+                    # polling only reconciles what the event stream has not delivered yet
+                    monitoring_items = [
+                        monitoring_item for monitoring_item in monitoring_items
+                        if not push_collector.delivered(monitoring_item.entity, monitoring_item.measurable,
+                                                        monitoring_item.t1)
+                    ]
+
+                    if not monitoring_items:
+                        continue
+
+                yield bright_node, monitoring_items
+
+        transform = self.__create_record_transform(measurables, series_ids, series_table, overflowed_series)
+
+        fetchers = self.__create_fetchers(fetch, nodes, settings.fetch_shards, shard_samples)
+
+        return fetchers, transform, [self.__send_record] * settings.sender_workers
+
+    def __create_batch_stages(self, bright_cluster: BrightCluster, nodes: dict, measurables: dict, series_ids: dict,
+                              series_table: SeriesKeyTable, emit_interval: int, overflowed_series: list,
+                              requested: dict, shard_samples: Optional[list], deadline: float) -> tuple:
+        settings = self.__get_settings()
+        transform_pool = self.__get_transform_pool()
+        push_collector = self.__get_push_collector()
+
+        cycle = self.__get_cycle() + 1
+        self.__set_cycle(cycle)
+
+        measurable_series = {
+            measurable_key: (series_id, measurables[measurable_key].name)
+            for measurable_key, series_id in series_ids.items()
+        }
+
+        cutoff = (int(time.time()) - (emit_interval * 60)) * 1000
+
+        # everything a worker needs besides the items themselves, shared by all chunks of this cycle
+        context = (
+            cycle,
+            cutoff,
+            self.__get_instrumentation_key(),
+            time.time(),
+            series_table.snapshot(),
+            measurable_series,
+            settings.max_series_per_node,
+            settings.series_overflow_policy,
+            self.__get_metric_priorities()
+        )
+
+        transform_pool.publish(context)
+
+        # fetch raw monitoring data chunk by chunk and hand it over as packed buffers
+        def fetch(shard: dict, oldest_samples: Optional[dict]) -> Iterable[tuple]:
+            for chunk in self.__shard_chunks(shard, settings.transform_chunk_size):
+                raw_monitoring_data = list()
+                if requested:
+                    raw_monitoring_data = bright_cluster.get_raw_monitoring_data(chunk, requested)
+
+                if oldest_samples is not None:
+                    observe_oldest_samples(raw_monitoring_data, oldest_samples, cutoff)
+
+                if push_collector is not None:
+                    # polling only reconciles what the event stream has not delivered yet
+                    raw_monitoring_data = [
+                        item for item in raw_monitoring_data
+                        if not push_collector.delivered(item.get('entity'), item.get('measurable'), item.get('t1', 0))
+                    ]
+
+                headers = tuple(
+                    (unique_key, bright_node.hostname, bright_node.rack_id)
+                    for unique_key, bright_node in chunk.items()
+                )
+
+                yield headers, pack_monitoring_items(raw_monitoring_data)
+
+        def transform(fetched: tuple) -> Iterable:
+            headers, buffer = fetched
+            yield transform_pool.submit(cycle, headers, buffer)
+
+        def send(pending) -> None:
+            # a worker that died takes its task along, the result would never arrive
+            try:
+                batches, overflow_count = pending.get(timeout=max(0.0, deadline - time.time()))
+            except multiprocessing.TimeoutError:
+                raise EmitMetricsTimeoutError('Emit Metrics unable to complete the job in given time period')
+            overflowed_series.append(overflow_count)
+
+            for priority, payload, records in batches:
+                self.__deliver(priority, payload, records, content_encoding='gzip')
+
+        fetchers = self.__create_fetchers(fetch, nodes, settings.fetch_shards, shard_samples)
+
+        return fetchers, transform, [send] * settings.sender_workers
 
     def emit_metrics(self, emit_interval: int) -> None:
+        profiler = self.__get_profiler()
+
+        with profiler.cycle('emit') as profile_session:
+            self.__emit_metrics(emit_interval, profile_session)
+
+    def __emit_metrics(self, emit_interval: int, profile_session: Optional[ProfileSession]) -> None:
         TraceLogger.info('Emit Metrics - Started')
 
         start_time = time.time()
 
         try:
             metrics = self.__get_metrics()
+            settings = self.__get_settings()
             bright_cluster = self.__get_bright_cluster()
 
             mutex = self.__get_mutex()
 
-            # thread-safe logic
-            mutex.acquire()
-            TraceLogger.info('Emit Metrics - Acquire Lock')
+            # thread-safe logic, the lock is released even when a Bright call fails
+            with mutex:
+                TraceLogger.info('Emit Metrics - Acquire Lock')
+
+                nodes = bright_cluster.get_nodes()
+                measurables = bright_cluster.get_measurables(metrics)
+
+                # node filters are resolved on refresh, only the selected nodes are fetched and sent
+                selected_nodes = self.__get_selected_nodes()
+                if selected_nodes is not None:
+                    nodes = {unique_key: node for unique_key, node in nodes.items() if unique_key in selected_nodes}
 
-            nodes = bright_cluster.get_nodes()
-            measurables = bright_cluster.get_measurables(metrics)
+                series_table = self.__get_series_table()
 
-            TraceLogger.info('Emit Metrics - Release Lock')
-            mutex.release()
+                fetch_planner = self.__get_fetch_planner()
+                sampling_intervals = bright_cluster.get_sampling_intervals(measurables) if fetch_planner else None
+
+                TraceLogger.info('Emit Metrics - Release Lock')
             # end
 
-            # fetch monitoring data in background
-            monitoring_data = bright_cluster.get_monitoring_data(nodes, measurables, emit_interval)
+            # measurables sharing a name are told apart by their parameter (e.g. per device or interface)
+            # the global cap admits series first-come, interning in key order keeps the admitted set stable
+            series_ids = dict()
+            for measurable_key, measurable in sorted(measurables.items(),
+                                                     key=lambda entry: (entry[1].name or '', entry[1].parameter or '')):
+                if measurable.name is None or measurable.type is None:
+                    continue
+                series_ids[measurable_key] = series_table.intern(measurable.name, measurable.parameter)
+
+            push_collector = self.__get_push_collector()
+            if push_collector is not None:
+                push_collector.watch(measurables.keys())
+                self.__set_push_context((nodes, measurables, series_ids, series_table))
+
+            overflowed_series = []
+
+            # measurables whose producers can not have sampled since the last fetch are left out of this cycle
+            requested = measurables
+            shard_samples = None
+            if fetch_planner is not None:
+                requested = fetch_planner.plan(measurables, sampling_intervals)
+                shard_samples = list()
+
+                TraceLogger.info('Emit Metrics - Fetch Plan: {0} of {1} measurables due'.format(
+                    len(requested), len(measurables)))
+
+            # stages overlap, the whole cycle still has to finish within the emit interval
+            deadline = start_time + emit_interval * 60
+
+            if self.__get_transform_pool() is None:
+                fetchers, transform, senders = self.__create_record_stages(
+                    bright_cluster, nodes, measurables, series_ids, series_table, emit_interval, overflowed_series,
+                    requested, shard_samples)
+            else:
+                fetchers, transform, senders = self.__create_batch_stages(
+                    bright_cluster, nodes, measurables, series_ids, series_table, emit_interval, overflowed_series,
+                    requested, shard_samples, deadline)
+
+            pipeline = EmitPipeline(settings.pipeline_queue_size, deadline=deadline,
+                                    instrument=profile_session.instrument if profile_session is not None else None)
+            pipeline.run(fetchers, transform, senders)
+
+            if fetch_planner is not None:
+                fetch_planner.observe(requested, shard_samples)
+
+            # pipeline items are chunks or possibly deferred records, the throttle counts what was actually sent,
+            # deferred payloads drained since the previous cycle included
+            counters = self.__get_throttle().drain_counters()
+
+            TraceLogger.info('Emit Metrics - Sent {0} records in {1:.2f} seconds'.format(
+                sum(items for (_, outcome), items in counters.items() if outcome == 'sent'), time.time() - start_time))
+
+            if sum(overflowed_series):
+                TraceLogger.warning('Emit Metrics - {0} series exceeded cardinality limits'.format(
+                    sum(overflowed_series)))
+
+            for (priority, outcome), items in sorted(counters.items()):
+                TraceLogger.info('Emit Metrics - Throttle: {0} {1} {2} records'.format(items, priority, outcome))
 
-            # checking for timeout
-            if (time.time() - start_time) / 60 > emit_interval:
-                raise EmitMetricsTimeoutError('Emit Metrics unable to complete the job in given time period')
+        except EmitMetricsTimeoutError:
+            TraceLogger.error('Emit Metrics - Terminated: Unable to complete Emit Metrics process in '
+                              '{0} minutes'.format(emit_interval))
 
-            for unique_key, bright_node in nodes.items():
-                node_metric_data = dict()
+            # tasks of the terminated cycle may still be running or lost with a dead worker, start over
+            self.__restart_transform_pool()
+        except Exception as ex:
+            TraceLogger.error('Emit Metrics - Failed: {0}'.format(ex))
 
-                node_metric_data['Hostname'] = bright_node.hostname
-                node_metric_data['RackId'] = bright_node.rack_id  # rack id will NA for non bare metal clusters
+        TraceLogger.info('Emit Metrics - Ended')
 
-                for monitoring_item in monitoring_data.get(unique_key, list()):
-                    # filtering out invalid metrics
-                    if monitoring_item.value is None or monitoring_item.measurable is None:
-                        continue
+    def push_metrics(self) -> None:
+        push_collector = self.__get_push_collector()
+        push_context = self.__get_push_context()
 
-                    measurable = measurables.get(monitoring_item.measurable)
+        # nodes and measurables are only known after the first emit cycle, pushed samples wait until then
+        if push_collector is None or push_context is None:
+            return
 
-                    # filtering out invalid metrics
-                    if measurable is None:
-                        continue
-                    if measurable.name is None or measurable.type is None:
-                        continue
+        start_time = time.time()
 
-                    node_metric_data[measurable.name] = monitoring_item.value
+        try:
+            settings = self.__get_settings()
+            nodes, measurables, series_ids, series_table = push_context
 
-                emitter = self.__get_emitter()
+            pushed = push_collector.drain()
+            if not pushed:
+                return
 
-                message = json.dumps(node_metric_data)
+            def fetch() -> Iterable[tuple]:
+                for unique_key, items in pushed.items():
+                    bright_node = nodes.get(unique_key)
+                    if bright_node is not None:
+                        yield bright_node, [BrightEntityMonitoringItem(item) for item in items]
 
-                # TODO: remove below line
-                print(message)
+            overflowed_series = []
+            record_transform = self.__create_record_transform(measurables, series_ids, series_table,
+                                                              overflowed_series)
 
-                emitter.info(message)
+            # records keep their node, so only the samples of nodes sent in full are acknowledged
+            def transform(fetched: tuple) -> Iterable[tuple]:
+                bright_node, _ = fetched
+                for prioritized_record in record_transform(fetched):
+                    yield bright_node.unique_key, prioritized_record
 
-                emit_handler = self.__get_emit_handler()
-                emit_handler.flush()
+            failed_nodes = set()
+
+            # a deferred record would go out again with the poll of its unacknowledged node, drop it instead
+            def send(node_record: tuple) -> None:
+                unique_key, prioritized_record = node_record
+                if not self.__send_record(prioritized_record, defer=False):
+                    failed_nodes.add(unique_key)
+
+            pipeline = EmitPipeline(settings.pipeline_queue_size)
+            sent = pipeline.run([fetch], transform, [send] * settings.sender_workers)
+
+            # whatever was dropped or left out is still picked up by the next poll
+            push_collector.acknowledge({
+                unique_key: items for unique_key, items in pushed.items()
+                if unique_key in nodes and unique_key not in failed_nodes
+            })
+
+            TraceLogger.info('Push Metrics - Sent {0} payloads for {1} nodes in {2:.2f} seconds'.format(
+                sent, len(pushed), time.time() - start_time))
 
-        except EmitMetricsTimeoutError:
-            TraceLogger.error('Emit Metrics - Terminated: Unable to complete Emit Metrics process in '
-                              '{0} minutes'.format(emit_interval))
         except Exception as ex:
-            TraceLogger.error('Emit Metrics - Failed: {0}'.format(ex))
+            TraceLogger.error('Push Metrics - Failed: {0}'.format(ex))
 
-        TraceLogger.info('Emit Metrics - Ended')
+    def __push_metrics_loop(self, flush_interval: int) -> None:
+        while True:
+            time.sleep(flush_interval)
+            self.push_metrics()
 
     def refresh_cluster(self, refresh_interval: int) -> None:
+        profiler = self.__get_profiler()
+
+        with profiler.cycle('refresh'):
+            self.__refresh_cluster(refresh_interval)
+
+    def __refresh_cluster(self, refresh_interval: int) -> None:
         TraceLogger.info('Refreshing Cluster - Started')
 
         start_time = time.time()
@@ -179,6 +836,7 @@ class ApplicationInsightsEmitter(object):
         try:
             # refreshing cluster in background
             bright_cluster = self.__create_bright_cluster()
+            selected_nodes = self.__select_nodes(bright_cluster)
 
             # checking for timeout
             if (time.time() - start_time) / 60 > refresh_interval:
@@ -187,15 +845,23 @@ class ApplicationInsightsEmitter(object):
             mutex = self.__get_mutex()
 
             # thread-safe logic
-            mutex.acquire()
-            TraceLogger.info('Refreshing Cluster - Acquire Lock')
+            with mutex:
+                TraceLogger.info('Refreshing Cluster - Acquire Lock')
+
+                self.__set_bright_cluster(bright_cluster)
+                self.__set_selected_nodes(selected_nodes)
 
-            self.__set_bright_cluster(bright_cluster)
+                # measurables may have been added or removed, start over with a fresh key table
+                self.__set_series_table(self.__create_series_table())
 
-            TraceLogger.info('Refreshing Cluster - Release Lock')
-            mutex.release()
+                TraceLogger.info('Refreshing Cluster - Release Lock')
             # end
 
+            # the collector guards its own source, subscribing to Bright does not need to hold up emit cycles
+            push_collector = self.__get_push_collector()
+            if push_collector is not None:
+                push_collector.attach(bright_cluster.get_event_source())
+
         except RefreshClusterTimeoutError:
             TraceLogger.error('Refresh Cluster - Terminated: Unable to complete Refresh Cluster process in '
                               '{0} minutes'.format(refresh_interval))
@@ -204,6 +870,17 @@ class ApplicationInsightsEmitter(object):
 
         TraceLogger.info('Refreshing Cluster - Ended')
 
+    def close(self) -> None:
+        push_collector = self.__get_push_collector()
+        if push_collector is not None:
+            push_collector.close()
+
+        transform_pool = self.__get_transform_pool()
+        if transform_pool is not None:
+            transform_pool.close(terminate=True)
+
+        self.__get_transport().close()
+
     def start(self, emit_interval: int, refresh_interval: int) -> None:
         TraceLogger.info('Monitoring Connector - Started')
         sleep_count = 0
@@ -214,24 +891,36 @@ class ApplicationInsightsEmitter(object):
         emit_metrics = threading.Thread()
         refresh_cluster = threading.Thread()
 
-        while True:
-            TraceLogger.info('Monitoring Connector Events - Triggered')
-
-            # emit metrics event
-            if sleep_count % emit_interval == 0:
-                if emit_metrics.is_alive():
-                    TraceLogger.error('Skipping Emit Metrics Event, Emit Metrics thread is alive')
-                else:
-                    emit_metrics = threading.Thread(target=self.emit_metrics, args=(emit_interval,))
-                    emit_metrics.start()
-
-            # refresh cluster event
-            if sleep_count % refresh_interval == 0:
-                if refresh_cluster.is_alive():
-                    TraceLogger.error('Skipping Refresh Cluster, Refresh Cluster thread is alive')
-                else:
-                    refresh_cluster = threading.Thread(target=self.refresh_cluster, args=(refresh_interval,))
-                    refresh_cluster.start()
-
-            time.sleep(60)
-            sleep_count += 1
+        # deferred payloads go out as soon as the throttle admits them rather than once per emit cycle
+        threading.Thread(target=self.__drain_deferred_loop, daemon=True).start()
+
+        # pushed samples are sent as they arrive, emit cycles keep polling to reconcile anything missed
+        if self.__get_push_collector() is not None:
+            flush_interval = self.__get_settings().push_flush_interval
+            threading.Thread(target=self.__push_metrics_loop, args=(flush_interval,), daemon=True).start()
+
+        # worker processes and their context directory do not outlive the connector
+        try:
+            while True:
+                TraceLogger.info('Monitoring Connector Events - Triggered')
+
+                # emit metrics event
+                if sleep_count % emit_interval == 0:
+                    if emit_metrics.is_alive():
+                        TraceLogger.error('Skipping Emit Metrics Event, Emit Metrics thread is alive')
+                    else:
+                        emit_metrics = threading.Thread(target=self.emit_metrics, args=(emit_interval,))
+                        emit_metrics.start()
+
+                # refresh cluster event
+                if sleep_count % refresh_interval == 0:
+                    if refresh_cluster.is_alive():
+                        TraceLogger.error('Skipping Refresh Cluster, Refresh Cluster thread is alive')
+                    else:
+                        refresh_cluster = threading.Thread(target=self.refresh_cluster, args=(refresh_interval,))
+                        refresh_cluster.start()
+
+                time.sleep(60)
+                sleep_count += 1
+        finally:
+            self.close()
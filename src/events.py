@@ -0,0 +1,204 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import threading
+
+from typing import (
+    Callable,
+    Iterable,
+    Optional
+)
+
+
+__all__ = [
+    'COLLECTION_MODE_POLL',
+    'COLLECTION_MODE_PUSH',
+    'COLLECTION_MODES',
+    'LocalEventSource',
+    'BrightEventSource',
+    'PushCollector'
+]
+
+
+COLLECTION_MODE_POLL = 'Poll'
+COLLECTION_MODE_PUSH = 'Push'
+
+COLLECTION_MODES = (COLLECTION_MODE_POLL, COLLECTION_MODE_PUSH)
+
+
+class LocalEventSource(object):
+    """Hands published monitoring items to every subscribed listener, in the publishing thread.
+
+    Stands in for the event stream of the head node, e.g. in replays and tests.
+    """
+
+    def __init__(self):
+        self.__listeners = []
+        self.__mutex = threading.Lock()
+
+    @property
+    def supported(self) -> bool:
+        return True
+
+    def subscribe(self, listener: Callable[[list], None]) -> None:
+        with self.__mutex:
+            self.__listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[list], None]) -> None:
+        with self.__mutex:
+            if listener in self.__listeners:
+                self.__listeners.remove(listener)
+
+    def has_listeners(self) -> bool:
+        with self.__mutex:
+            return bool(self.__listeners)
+
+    def publish(self, items: list) -> None:
+        with self.__mutex:
+            listeners = list(self.__listeners)
+
+        for listener in listeners:
+            listener(items)
+
+
+class BrightEventSource(LocalEventSource):
+    """Monitoring data pushed by CMDaemon through the event stream of a pythoncm Cluster.
+
+    The event hook of the cluster is registered with the first listener. Events that carry monitoring
+    data, either as a single item or as a list of ``items``, are published, anything else is ignored.
+    Older pythoncm releases without an event hook are reported as not ``supported``.
+    """
+
+    def __init__(self, cluster):
+        LocalEventSource.__init__(self)
+
+        self.__set_cluster(cluster)
+        self.__registered = False
+
+    def __get_cluster(self):
+        return self.__cluster
+
+    def __set_cluster(self, cluster) -> None:
+        self.__cluster = cluster
+
+    @property
+    def supported(self) -> bool:
+        return callable(getattr(self.__get_cluster(), 'add_event_handler', None))
+
+    def subscribe(self, listener: Callable[[list], None]) -> None:
+        LocalEventSource.subscribe(self, listener)
+
+        if not self.__registered and self.supported:
+            self.__get_cluster().add_event_handler(self.__receive)
+            self.__registered = True
+
+    def unsubscribe(self, listener: Callable[[list], None]) -> None:
+        LocalEventSource.unsubscribe(self, listener)
+
+        remove_event_handler = getattr(self.__get_cluster(), 'remove_event_handler', None)
+        if self.__registered and not self.has_listeners() and callable(remove_event_handler):
+            remove_event_handler(self.__receive)
+            self.__registered = False
+
+    @staticmethod
+    def __monitoring_items(event) -> Optional[list]:
+        raw = getattr(event, 'raw', event)
+        if not isinstance(raw, dict):
+            return None
+
+        if isinstance(raw.get('items', None), list):
+            return [item for item in raw['items'] if isinstance(item, dict) and 'measurable' in item]
+        elif 'entity' in raw and 'measurable' in raw:
+            return [raw]
+        else:
+            return None
+
+    def __receive(self, event) -> None:
+        items = self.__monitoring_items(event)
+        if items:
+            self.publish(items)
+
+
+class PushCollector(object):
+    """Keeps the latest pushed sample per (entity, measurable) until the next drain.
+
+    Drained samples are remembered by their time once acknowledged as sent, so polling can leave out
+    whatever was already delivered through the event stream and only reconcile what went missing.
+    """
+
+    def __init__(self):
+        self.__source = None
+        self.__measurables = None
+
+        self.__pending = dict()
+        self.__delivered = dict()
+
+        self.__mutex = threading.Lock()
+
+    def attach(self, source: LocalEventSource) -> None:
+        """Listens to ``source`` instead of the current one, e.g. after a cluster refresh."""
+        with self.__mutex:
+            previous, self.__source = self.__source, source
+
+        if previous is not None:
+            previous.unsubscribe(self.__receive)
+
+        source.subscribe(self.__receive)
+
+    def close(self) -> None:
+        with self.__mutex:
+            previous, self.__source = self.__source, None
+
+        if previous is not None:
+            previous.unsubscribe(self.__receive)
+
+    def watch(self, measurables: Iterable[int]) -> None:
+        """Drops pushed samples of any other measurable from now on."""
+        with self.__mutex:
+            self.__measurables = set(measurables)
+
+    def __receive(self, items: list) -> None:
+        with self.__mutex:
+            measurables = self.__measurables
+
+            for item in items:
+                entity = item.get('entity', None)
+                measurable = item.get('measurable', None)
+                t1 = item.get('t1', 0)
+
+                if entity is None or measurable is None:
+                    continue
+                if measurables is not None and measurable not in measurables:
+                    continue
+
+                key = (entity, measurable)
+                if t1 <= self.__delivered.get(key, -1):
+                    continue
+
+                pending = self.__pending.setdefault(entity, dict())
+                if measurable not in pending or pending[measurable].get('t1', 0) <= t1:
+                    pending[measurable] = item
+
+    def drain(self) -> dict:
+        """Takes the pending samples as {entity: [raw monitoring items]}, see ``acknowledge``."""
+        with self.__mutex:
+            pending, self.__pending = self.__pending, dict()
+
+        return {entity: list(items.values()) for entity, items in pending.items()}
+
+    def acknowledge(self, drained: dict) -> None:
+        """Marks drained samples, as {entity: [raw monitoring items]}, delivered once they have been sent."""
+        with self.__mutex:
+            for entity, items in drained.items():
+                for item in items:
+                    key = (entity, item.get('measurable', None))
+                    t1 = item.get('t1', 0)
+
+                    if t1 > self.__delivered.get(key, -1):
+                        self.__delivered[key] = t1
+
+    def delivered(self, entity: int, measurable: int, t1: int) -> bool:
+        return t1 <= self.__delivered.get((entity, measurable), -1)
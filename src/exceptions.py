@@ -8,7 +8,10 @@ __all__ = [
     'InvalidConfigurationFileError',
     'BrightClusterConnectionError',
     'EmitMetricsTimeoutError',
-    'RefreshClusterTimeoutError'
+    'RefreshClusterTimeoutError',
+    'IngestionTransportError',
+    'IngestionUnavailableError',
+    'IngestionPartialDeliveryError'
 ]
 
 
@@ -39,3 +42,22 @@ class RefreshClusterTimeoutError(Error):
     """Raised when Refresh Cluster unable to complete the job in given time period"""
     def __init__(self, *args, **kwargs):
         pass
+
+
+class IngestionTransportError(Error):
+    """Raised when telemetry could not be delivered to the ingestion endpoint"""
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class IngestionUnavailableError(IngestionTransportError):
+    """Raised when the ingestion endpoint is unreachable, failing or throttling and may accept the telemetry later"""
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class IngestionPartialDeliveryError(IngestionUnavailableError):
+    """Raised when the ingestion endpoint accepted part of a batch, ``payload`` holds the items it may take later"""
+    def __init__(self, *args, payload: bytes = b'', items: int = 0, **kwargs):
+        self.payload = payload
+        self.items = items
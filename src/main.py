@@ -5,14 +5,23 @@
 
 
 import os
+import sys
 import json
+import signal
 import argparse
 import configparser
 
 from emitter import ApplicationInsightsEmitter
+from profiler import CycleProfiler
 
+from settings import ConnectorSettings
+from throttle import PRIORITIES
 from exceptions import InvalidConfigurationFileError
-from constants import WORKINGDIR
+from constants import (
+    WORKINGDIR,
+    PROFILEDIR,
+    PROFILE_FLAG_FILEPATH
+)
 
 
 def main():
@@ -20,6 +29,10 @@ def main():
 
     parser.add_argument('--emit-interval', type=int, default=5, help='emit interval period in minutes')
     parser.add_argument('--refresh-interval', type=int, default=1440, help='refresh interval period in minutes')
+    parser.add_argument('--record', help='capture raw Bright responses to this JSONL file (.gz to compress)')
+    parser.add_argument('--replay', help='serve Bright responses from this capture instead of the head node')
+    parser.add_argument('--replay-speed', type=float, help='replay speed multiplier, 0 steps one cycle per emit')
+    parser.add_argument('--profile-cycles', type=int, help='profile the first emit and refresh cycles after start')
 
     arguments = parser.parse_args()
     emit_interval, refresh_interval = arguments.emit_interval, arguments.refresh_interval
@@ -31,6 +44,14 @@ def main():
         bright_host_ip = appconfig['BrightHostIP']
         instrumentation_key = appconfig['InstrumentationKey']
 
+        # command line options take precedence over the app config file
+        for key, value in [('RecordFile', arguments.record), ('ReplayFile', arguments.replay),
+                           ('ReplaySpeed', arguments.replay_speed)]:
+            if value is not None:
+                appconfig[key] = value
+
+        settings = ConnectorSettings(appconfig)
+
     except FileNotFoundError:
         raise InvalidConfigurationFileError('Unable to locate app config file.')
     except KeyError:
@@ -44,16 +65,34 @@ def main():
         metricsconfig.read(metricsconfig_file_path)
 
         metrics = []
+        metric_priorities = dict()
         for section in metricsconfig.sections():
+            priority = metricsconfig.get(section, 'Priority', fallback=None)
+            if priority is not None and priority.lower() not in PRIORITIES:
+                raise InvalidConfigurationFileError('Unknown priority in metric config file.')
+
             for item in metricsconfig.items(section):
                 if item[1] is None:
                     metrics.append(item[0])
+                    if priority is not None:
+                        metric_priorities[item[0]] = priority.lower()
     except FileNotFoundError:
         raise InvalidConfigurationFileError('Unable to locate metric config file.')
     except IndexError:
         raise InvalidConfigurationFileError('Unable to read metric config file.')
 
-    emitter = ApplicationInsightsEmitter(bright_host_ip, metrics, instrumentation_key)
+    profiler = CycleProfiler(PROFILEDIR, PROFILE_FLAG_FILEPATH, settings.profile_cycles, settings.profile_top)
+
+    # profiling on demand, e.g. kill -USR1 <pid> profiles the next cycles of the running connector
+    profiler.install_signal_handler()
+    if arguments.profile_cycles is not None:
+        profiler.request(arguments.profile_cycles)
+
+    # docker stop sends SIGTERM, exiting through SystemExit lets the emitter shut its worker processes down
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    emitter = ApplicationInsightsEmitter(bright_host_ip, metrics, instrumentation_key, settings, metric_priorities,
+                                         profiler)
     emitter.start(emit_interval, refresh_interval)
 
 
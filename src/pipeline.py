@@ -0,0 +1,174 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import time
+import queue
+import threading
+
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Optional
+)
+
+from exceptions import EmitMetricsTimeoutError
+
+
+__all__ = [
+    'EmitPipeline'
+]
+
+
+# marks the end of a producer's stream inside a stage queue
+_END_OF_STREAM = object()
+
+
+class EmitPipeline(object):
+    """Runs fetch, transform and send stages concurrently, connected by bounded queues.
+
+    Fetchers are drained by their own threads, a single transformer thread turns fetched items into
+    records and a pool of senders ships them. A full queue blocks the stage feeding it, so at most
+    ``queue_size`` items are buffered between any two stages.
+    """
+
+    def __init__(self, queue_size: int, deadline: Optional[float] = None, poll_interval: float = 0.5,
+                 instrument: Optional[Callable[[Callable], Callable]] = None):
+        self.__set_queue_size(queue_size)
+        self.__set_deadline(deadline)
+        self.__set_poll_interval(poll_interval)
+        self.__set_instrument(instrument)
+
+    def __get_queue_size(self) -> int:
+        return self.__queue_size
+
+    def __set_queue_size(self, queue_size: int) -> None:
+        self.__queue_size = queue_size
+
+    def __get_deadline(self) -> Optional[float]:
+        return self.__deadline
+
+    def __set_deadline(self, deadline: Optional[float]) -> None:
+        self.__deadline = deadline
+
+    def __get_poll_interval(self) -> float:
+        return self.__poll_interval
+
+    def __set_poll_interval(self, poll_interval: float) -> None:
+        self.__poll_interval = poll_interval
+
+    def __get_instrument(self) -> Optional[Callable[[Callable], Callable]]:
+        return self.__instrument
+
+    def __set_instrument(self, instrument: Optional[Callable[[Callable], Callable]]) -> None:
+        self.__instrument = instrument
+
+    def __check_deadline(self) -> None:
+        deadline = self.__get_deadline()
+        if deadline is not None and time.time() > deadline:
+            raise EmitMetricsTimeoutError('Emit Metrics unable to complete the job in given time period')
+
+    def __put(self, stage_queue: queue.Queue, item: Any, stopped: threading.Event) -> bool:
+        while not stopped.is_set():
+            self.__check_deadline()
+            try:
+                stage_queue.put(item, timeout=self.__get_poll_interval())
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def __get(self, stage_queue: queue.Queue, stopped: threading.Event) -> Any:
+        while not stopped.is_set():
+            self.__check_deadline()
+            try:
+                return stage_queue.get(timeout=self.__get_poll_interval())
+            except queue.Empty:
+                continue
+
+        return _END_OF_STREAM
+
+    def run(self, fetchers: Iterable[Callable[[], Iterable]], transform: Callable[[Any], Iterable],
+            senders: Iterable[Callable[[Any], None]]) -> int:
+        fetchers = list(fetchers)
+        senders = list(senders)
+
+        transform_queue = queue.Queue(maxsize=self.__get_queue_size())
+        send_queue = queue.Queue(maxsize=self.__get_queue_size())
+
+        stopped = threading.Event()
+        errors = []
+        sent = []
+
+        instrument = self.__get_instrument()
+
+        def stage(target: Callable, *args) -> Callable[[], None]:
+            def runner() -> None:
+                try:
+                    target(*args)
+                except Exception as ex:
+                    errors.append(ex)
+                    stopped.set()
+
+            # e.g. to profile every stage thread
+            return instrument(runner) if instrument is not None else runner
+
+        def fetch(fetcher: Callable[[], Iterable]) -> None:
+            try:
+                for item in fetcher():
+                    if not self.__put(transform_queue, item, stopped):
+                        return
+            finally:
+                self.__put(transform_queue, _END_OF_STREAM, stopped)
+
+        def transformer() -> None:
+            pending = len(fetchers)
+
+            try:
+                while pending:
+                    item = self.__get(transform_queue, stopped)
+
+                    if item is _END_OF_STREAM:
+                        if stopped.is_set():
+                            return
+                        pending -= 1
+                        continue
+
+                    for record in transform(item):
+                        if not self.__put(send_queue, record, stopped):
+                            return
+            finally:
+                for _ in senders:
+                    self.__put(send_queue, _END_OF_STREAM, stopped)
+
+        def send(sender: Callable[[Any], None]) -> None:
+            count = 0
+
+            while True:
+                record = self.__get(send_queue, stopped)
+                if record is _END_OF_STREAM:
+                    break
+
+                sender(record)
+                count += 1
+
+            sent.append(count)
+
+        threads = [threading.Thread(target=stage(fetch, fetcher)) for fetcher in fetchers]
+        threads.append(threading.Thread(target=stage(transformer)))
+        threads.extend(threading.Thread(target=stage(send, sender)) for sender in senders)
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+        return sum(sent)
@@ -0,0 +1,91 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import time
+import threading
+
+from typing import (
+    Iterable,
+    Optional
+)
+
+
+__all__ = [
+    'observe_oldest_samples',
+    'FetchPlanner'
+]
+
+
+def observe_oldest_samples(items: Iterable[dict], oldest_samples: dict, cutoff: int = 0) -> None:
+    """Lowers ``oldest_samples[measurable]`` to the oldest sample time among the raw monitoring items.
+
+    Samples older than ``cutoff`` are not sent anyway and are left out, so a node that stopped
+    reporting does not keep its measurables due.
+    """
+    for item in items:
+        measurable = item.get('measurable', None)
+        t1 = item.get('t1', None)
+
+        if measurable is None or t1 is None or t1 < cutoff:
+            continue
+
+        if t1 < oldest_samples.get(measurable, t1 + 1):
+            oldest_samples[measurable] = t1
+
+
+class FetchPlanner(object):
+    """Groups measurables by sampling interval and only requests a group once new samples can exist.
+
+    For every measurable the planner remembers the oldest latest sample seen across all nodes. A
+    group is due once that sample plus the sampling interval has passed for any of its members.
+    Measurables with an unknown interval or without fresh samples so far are requested every cycle,
+    and a sample that shows up late keeps its group due until it arrives, so nothing within the
+    freshness window is skipped. Samples outside that window are not observed at all.
+    """
+
+    def __init__(self):
+        self.__oldest_samples = dict()
+        self.__mutex = threading.Lock()
+
+    @staticmethod
+    def buckets(sampling_intervals: dict) -> dict:
+        """Maps each sampling interval in seconds (None when unknown) to the measurable keys using it."""
+        buckets = dict()
+        for measurable_key, interval in sampling_intervals.items():
+            buckets.setdefault(interval, list()).append(measurable_key)
+
+        return buckets
+
+    def plan(self, measurables: dict, sampling_intervals: dict, now: Optional[float] = None) -> dict:
+        now_ms = int((now if now is not None else time.time()) * 1000)
+
+        with self.__mutex:
+            oldest_samples = dict(self.__oldest_samples)
+
+        due = dict()
+        for interval, measurable_keys in self.buckets(
+                {key: sampling_intervals.get(key) for key in measurables.keys()}).items():
+            if interval is None or any(key not in oldest_samples or
+                                       oldest_samples[key] + interval * 1000 <= now_ms for key in measurable_keys):
+                for key in measurable_keys:
+                    due[key] = measurables[key]
+
+        return due
+
+    def observe(self, requested: dict, shard_samples: Iterable[dict]) -> None:
+        """Takes the oldest sample time per measurable seen by any shard fetching the ``requested`` measurables."""
+        oldest_samples = dict()
+        for samples in shard_samples:
+            for measurable_key, t1 in samples.items():
+                if t1 < oldest_samples.get(measurable_key, t1 + 1):
+                    oldest_samples[measurable_key] = t1
+
+        with self.__mutex:
+            for measurable_key in requested.keys():
+                if measurable_key in oldest_samples:
+                    self.__oldest_samples[measurable_key] = oldest_samples[measurable_key]
+                else:
+                    self.__oldest_samples.pop(measurable_key, None)
@@ -0,0 +1,238 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import io
+import os
+import time
+import pstats
+import signal
+import cProfile
+import threading
+import contextlib
+import tracemalloc
+
+from typing import (
+    Callable,
+    Optional
+)
+
+from logger import TraceLogger
+
+
+__all__ = [
+    'ProfileSession',
+    'CycleProfiler'
+]
+
+
+class ProfileSession(object):
+    """cProfile data of one cycle, gathered from the cycle's thread and every thread it instruments."""
+
+    def __init__(self, name: str):
+        self.__set_name(name)
+
+        self.__profiles = []
+        self.__mutex = threading.Lock()
+
+    def __get_name(self) -> str:
+        return self.__name
+
+    def __set_name(self, name: str) -> None:
+        self.__name = name
+
+    @property
+    def name(self) -> str:
+        return self.__get_name()
+
+    @contextlib.contextmanager
+    def profile(self):
+        profile = cProfile.Profile()
+
+        try:
+            profile.enable()
+        except ValueError:
+            # newer interpreters allow a single active profiler, this thread goes unprofiled then
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            profile.disable()
+
+            with self.__mutex:
+                self.__profiles.append(profile)
+
+    def instrument(self, target: Callable) -> Callable:
+        def runner(*args, **kwargs):
+            with self.profile():
+                return target(*args, **kwargs)
+
+        return runner
+
+    def stats(self) -> Optional[pstats.Stats]:
+        with self.__mutex:
+            profiles = list(self.__profiles)
+
+        if not profiles:
+            return None
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+
+        return stats
+
+
+class CycleProfiler(object):
+    """Profiles the next emit or refresh cycles once asked to, through a signal, a flag file or directly.
+
+    Every profiled cycle writes a cProfile dump (``.prof``, readable with ``pstats`` or snakeviz) and a
+    tracemalloc snapshot (``.tracemalloc``) to ``output_directory`` and logs the top functions and
+    allocation growth. While nothing is requested a cycle only pays for one check of the flag file.
+    """
+
+    def __init__(self, output_directory: str, flag_filepath: Optional[str] = None, cycles: int = 3, top: int = 25):
+        self.__set_output_directory(output_directory)
+        self.__set_flag_filepath(flag_filepath)
+        self.__set_cycles(cycles)
+        self.__set_top(top)
+
+        self.__remaining = 0
+        self.__tracing = 0
+        self.__started_tracing = False
+
+        self.__mutex = threading.Lock()
+
+    def __get_output_directory(self) -> str:
+        return self.__output_directory
+
+    def __set_output_directory(self, output_directory: str) -> None:
+        self.__output_directory = output_directory
+
+    def __get_flag_filepath(self) -> Optional[str]:
+        return self.__flag_filepath
+
+    def __set_flag_filepath(self, flag_filepath: Optional[str]) -> None:
+        self.__flag_filepath = flag_filepath
+
+    def __get_cycles(self) -> int:
+        return self.__cycles
+
+    def __set_cycles(self, cycles: int) -> None:
+        self.__cycles = cycles
+
+    def __get_top(self) -> int:
+        return self.__top
+
+    def __set_top(self, top: int) -> None:
+        self.__top = top
+
+    def request(self, cycles: Optional[int] = None) -> None:
+        cycles = cycles if cycles is not None else self.__get_cycles()
+
+        # only assigns an int, safe to call from a signal handler
+        self.__remaining = max(self.__remaining, cycles)
+
+    def install_signal_handler(self, signum: Optional[int] = getattr(signal, 'SIGUSR1', None)) -> None:
+        # signals are not available on every platform
+        if signum is None:
+            return
+
+        signal.signal(signum, lambda received_signum, frame: self.request())
+
+    def __check_flag_file(self) -> None:
+        flag_filepath = self.__get_flag_filepath()
+        if flag_filepath is None or not os.path.exists(flag_filepath):
+            return
+
+        cycles = None
+        try:
+            with open(flag_filepath) as file_pointer:
+                content = file_pointer.read().strip()
+            cycles = int(content) if content else None
+
+            os.remove(flag_filepath)
+        except (OSError, ValueError) as ex:
+            TraceLogger.warning('Profiler - Unable to read flag file: {0}'.format(ex))
+
+        self.request(cycles)
+
+    def __begin(self) -> bool:
+        self.__check_flag_file()
+
+        with self.__mutex:
+            if self.__remaining <= 0:
+                return False
+
+            self.__remaining -= 1
+
+            # cycles may overlap, tracing stops with the last one of them
+            if self.__tracing == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.__started_tracing = True
+            self.__tracing += 1
+
+        return True
+
+    def __end(self) -> None:
+        with self.__mutex:
+            self.__tracing -= 1
+            if self.__tracing == 0 and self.__started_tracing:
+                tracemalloc.stop()
+                self.__started_tracing = False
+
+    @contextlib.contextmanager
+    def cycle(self, name: str):
+        """Yields a ProfileSession when this cycle is profiled and None otherwise."""
+        if not self.__begin():
+            yield None
+            return
+
+        session = ProfileSession(name)
+        started_at = snapshot = None
+
+        try:
+            snapshot = tracemalloc.take_snapshot()
+            started_at = time.time()
+
+            with session.profile():
+                yield session
+        finally:
+            try:
+                self.__report(session, started_at, snapshot, tracemalloc.take_snapshot())
+            except Exception as ex:
+                TraceLogger.error('Profiler - Failed to write {0} profile: {1}'.format(name, ex))
+            finally:
+                self.__end()
+
+    def __report(self, session: ProfileSession, started_at: float, first_snapshot: tracemalloc.Snapshot,
+                 last_snapshot: tracemalloc.Snapshot) -> None:
+        output_directory = self.__get_output_directory()
+        os.makedirs(output_directory, exist_ok=True)
+
+        top = self.__get_top()
+        prefix = os.path.join(output_directory, '{0}-{1}'.format(
+            session.name, time.strftime('%Y%m%d-%H%M%S', time.localtime(started_at))))
+
+        stats = session.stats()
+        if stats is not None:
+            stats.dump_stats(prefix + '.prof')
+
+            summary = io.StringIO()
+            stats.stream = summary
+            stats.sort_stats('cumulative').print_stats(top)
+
+            TraceLogger.info('Profiler - {0} cycle, top {1} functions by cumulative time:\n{2}'.format(
+                session.name, top, summary.getvalue()))
+
+        last_snapshot.dump(prefix + '.tracemalloc')
+
+        growth = last_snapshot.compare_to(first_snapshot, 'lineno')[:top]
+        TraceLogger.info('Profiler - {0} cycle, top {1} allocation sites by growth:\n{2}'.format(
+            session.name, top, '\n'.join(str(statistic) for statistic in growth)))
+
+        TraceLogger.info('Profiler - {0} cycle written to {1}.*'.format(session.name, prefix))
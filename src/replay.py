@@ -0,0 +1,347 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import gzip
+import json
+import time
+import threading
+
+from types import SimpleNamespace
+from typing import (
+    Iterable,
+    Optional
+)
+
+from classes import (
+    BrightNode,
+    BrightMeasurable,
+    BrightPowerStatus,
+    BrightDeviceStatus,
+    BrightEntityMonitoringItem,
+)
+
+from planner import observe_oldest_samples
+from events import LocalEventSource
+
+
+__all__ = [
+    'MonitoringRecorder',
+    'ReplayBrightCluster'
+]
+
+
+def _open_capture(filepath: str, mode: str):
+    if filepath.endswith('.gz'):
+        return gzip.open(filepath, mode + 't', encoding='utf-8')
+    else:
+        return open(filepath, mode, encoding='utf-8')
+
+
+def _entity_keys(entities: dict) -> list:
+    return [entity.unique_key for entity in entities.values()]
+
+
+class MonitoringRecorder(object):
+    """Appends the raw responses seen by a BrightCluster to a JSONL capture, gzipped for ``.gz`` paths.
+
+    Every ``measurables`` record, i.e. every emit cycle, starts a new cycle of the capture, the
+    monitoring and status responses that follow it belong to that cycle. ``nodes`` records also come
+    from refreshes and node selection, the latest one is used by the cycles that follow it.
+    """
+
+    def __init__(self, filepath: str):
+        self.__set_filepath(filepath)
+        self.__mutex = threading.Lock()
+
+    def __get_filepath(self) -> str:
+        return self.__filepath
+
+    def __set_filepath(self, filepath: str) -> None:
+        self.__filepath = filepath
+
+    def __write(self, call: str, response, **request) -> None:
+        record = {
+            'call': call,
+            'time': time.time(),
+            'request': request,
+            'response': response
+        }
+
+        line = json.dumps(record, default=str)
+
+        with self.__mutex:
+            with _open_capture(self.__get_filepath(), 'a') as file_pointer:
+                file_pointer.write(line + '\n')
+
+    def record_nodes(self, nodes: dict) -> None:
+        response = []
+        for bright_node in nodes.values():
+            raw_entity = bright_node.get_raw_entity()
+            response.append({
+                'uniqueKey': bright_node.unique_key,
+                'hostname': getattr(raw_entity, 'hostname', None),
+                'rack': bright_node.rack_name if getattr(raw_entity, 'rack', None) is not None else None,
+                'category': bright_node.category
+            })
+
+        self.__write('nodes', response)
+
+    def record_measurables(self, measurables: dict) -> None:
+        response = []
+        for bright_measurable in measurables.values():
+            response.append({
+                'uniqueKey': bright_measurable.unique_key,
+                'name': bright_measurable.name,
+                'parameter': bright_measurable.parameter,
+                'typeClass': bright_measurable.type
+            })
+
+        self.__write('measurables', response)
+
+    def record_sampling_intervals(self, sampling_intervals: dict) -> None:
+        self.__write('sampling_intervals', sampling_intervals)
+
+    def record_monitoring_data(self, call: str, entities: dict, measurables: dict, items: list) -> None:
+        self.__write(call, items, entities=_entity_keys(entities), measurables=_entity_keys(measurables))
+
+    def record_power_status(self, devices, power_status) -> None:
+        response = None
+        if len(power_status) == 2:
+            response = [
+                power_status[0],
+                [{'device': getattr(item, 'device', None), 'state': getattr(item, 'state', None)}
+                 for item in power_status[1] or list()]
+            ]
+
+        self.__write('power_status', response)
+
+    def record_device_status(self, devices, device_status) -> None:
+        response = [
+            {'refDeviceUniqueKey': getattr(item, 'refDeviceUniqueKey', None), 'status': getattr(item, 'status', None)}
+            for item in device_status
+        ]
+
+        self.__write('device_status', response)
+
+
+class ReplayBrightCluster(object):
+    """Serves a capture written by MonitoringRecorder through the BrightCluster interface.
+
+    With a ``speed`` of 0 every ``get_measurables`` call, i.e. every emit cycle, steps to the next
+    recorded cycle, which makes replays deterministic. Any other speed follows the recorded timeline
+    at that multiple of real time. The capture loops once exhausted and sample timestamps are shifted
+    so the data always looks fresh. Its event source only carries what is published to it directly.
+    """
+
+    def __init__(self, filepath: str, speed: float = 1.0):
+        self.__set_speed(speed)
+        self.__set_cycles(self.__load_cycles(filepath))
+
+        self.__started_at = time.time()
+        self.__position = -1
+
+        self.__event_source = LocalEventSource()
+
+        self.__mutex = threading.Lock()
+
+    def __get_speed(self) -> float:
+        return self.__speed
+
+    def __set_speed(self, speed: float) -> None:
+        self.__speed = speed
+
+    def __get_cycles(self) -> list:
+        return self.__cycles
+
+    def __set_cycles(self, cycles: list) -> None:
+        self.__cycles = cycles
+
+    @staticmethod
+    def __load_cycles(filepath: str) -> list:
+        cycles = []
+        cycle = None
+        nodes = list()
+
+        # responses recorded ahead of the first emit cycle, e.g. by node selection, belong to that cycle
+        preamble = {'time': None, 'nodes': list(), 'measurables': list(), 'calls': dict()}
+
+        with _open_capture(filepath, 'r') as file_pointer:
+            for line in file_pointer:
+                if not line.strip():
+                    continue
+
+                record = json.loads(line)
+
+                if preamble['time'] is None:
+                    preamble['time'] = record['time']
+
+                if record['call'] == 'nodes':
+                    nodes = record['response']
+                elif record['call'] == 'measurables':
+                    cycle = {
+                        'time': record['time'],
+                        'nodes': nodes,
+                        'measurables': record['response'],
+                        'calls': preamble['calls'] if cycle is None else dict()
+                    }
+                    cycles.append(cycle)
+                else:
+                    (cycle or preamble)['calls'].setdefault(record['call'], list()).append(record)
+
+        # captures without measurable lookups are served as a single cycle
+        if not cycles and preamble['time'] is not None:
+            preamble['nodes'] = nodes
+            cycles.append(preamble)
+
+        return cycles
+
+    def __current_cycle(self, advance: bool = False) -> dict:
+        cycles = self.__get_cycles()
+        speed = self.__get_speed()
+
+        with self.__mutex:
+            if speed <= 0:
+                # lookups ahead of the first emit cycle, e.g. node selection, read the first cycle
+                if advance:
+                    self.__position += 1
+                return cycles[max(self.__position, 0) % len(cycles)]
+
+            first, last = cycles[0]['time'], cycles[-1]['time']
+            duration = max(last - first, 1.0)
+
+            replay_time = first + ((time.time() - self.__started_at) * speed) % duration
+
+            current = cycles[0]
+            for cycle in cycles:
+                if cycle['time'] > replay_time:
+                    break
+                current = cycle
+
+            return current
+
+    def __replay_items(self, call: str, entities: dict, measurables: dict) -> list:
+        cycle = self.__current_cycle()
+
+        entity_keys = set(_entity_keys(entities))
+        measurable_keys = set(_entity_keys(measurables))
+
+        # monitoring samples are moved forward by the time passed since they were captured
+        shift = int((time.time() - cycle['time']) * 1000)
+
+        items = []
+        for record in cycle['calls'].get(call, list()):
+            for item in record['response']:
+                if item.get('entity') not in entity_keys or item.get('measurable') not in measurable_keys:
+                    continue
+
+                item = dict(item)
+                item['t0'] = item.get('t0', 0) + shift
+                item['t1'] = item.get('t1', 0) + shift
+                items.append(item)
+
+        return items
+
+    @staticmethod
+    def __group_items(items: Iterable[dict]) -> dict:
+        result = dict()
+        for item in items:
+            bright_monitoring_item = BrightEntityMonitoringItem(item)
+            result.setdefault(bright_monitoring_item.entity, []).append(bright_monitoring_item)
+
+        return result
+
+    @staticmethod
+    def __entities_lookup(records: list, keywords: Optional[Iterable[str]]) -> list:
+        keywords_lookup = set(keywords) if keywords is not None else None
+
+        entities = []
+        for record in records:
+            if keywords_lookup is None or record.get('name', record.get('hostname')) in keywords_lookup:
+                entities.append(SimpleNamespace(**record))
+
+        return entities
+
+    def get_event_source(self) -> LocalEventSource:
+        return self.__event_source
+
+    def get_nodes(self, keywords: Iterable[str] = None) -> dict:
+        cycle = self.__current_cycle()
+
+        result = dict()
+        for node in self.__entities_lookup(cycle['nodes'], keywords):
+            bright_node = BrightNode(node)
+            result[bright_node.unique_key] = bright_node
+
+        return result
+
+    def get_measurables(self, keywords: Iterable[str] = None) -> dict:
+        # node lookups also happen on cluster refreshes, measurable lookups only once per emit cycle
+        cycle = self.__current_cycle(advance=True)
+
+        result = dict()
+        for measurable in self.__entities_lookup(cycle['measurables'], keywords):
+            bright_measurable = BrightMeasurable(measurable)
+            result[bright_measurable.unique_key] = bright_measurable
+
+        return result
+
+    def get_sampling_intervals(self, measurables: dict) -> dict:
+        cycle = self.__current_cycle()
+
+        recorded = dict()
+        for record in cycle['calls'].get('sampling_intervals', list()):
+            recorded.update(record['response'])
+
+        # JSON turned the measurable keys into strings
+        return {measurable_key: recorded.get(str(measurable_key)) for measurable_key in measurables.keys()}
+
+    def get_latest_monitoring_data(self, entities: dict, measurables: dict) -> dict:
+        return self.__group_items(self.__replay_items('get_latest_monitoring_data', entities, measurables))
+
+    def get_dump_monitoring_data(self, entities: dict, measurables: dict) -> dict:
+        return self.__group_items(self.__replay_items('dump_monitoring_data', entities, measurables))
+
+    def get_sample_now(self, entities: dict, measurables: dict) -> dict:
+        # sampling on demand can not be replayed, serve the latest data instead
+        return self.get_latest_monitoring_data(entities, measurables)
+
+    def get_monitoring_data(self, entities: dict, measurables: dict, interval: int,
+                            oldest_samples: dict = None) -> dict:
+        cutoff = (int(time.time()) - (interval * 60)) * 1000
+
+        items = self.__replay_items('get_latest_monitoring_data', entities, measurables)
+        if oldest_samples is not None:
+            observe_oldest_samples(items, oldest_samples, cutoff)
+
+        return self.__group_items(item for item in items if item.get('t1', 0) >= cutoff)
+
+    def get_raw_monitoring_data(self, entities: dict, measurables: dict) -> list:
+        return self.__replay_items('get_latest_monitoring_data', entities, measurables)
+
+    def get_power_status(self, devices: dict) -> dict:
+        cycle = self.__current_cycle()
+
+        result = dict()
+        for record in cycle['calls'].get('power_status', list()):
+            if record['response'] is None or not record['response'][0]:
+                continue
+
+            for item in record['response'][1]:
+                bright_power_status = BrightPowerStatus(SimpleNamespace(**item))
+                result[bright_power_status.device] = bright_power_status
+
+        return result
+
+    def get_device_status(self, devices: dict) -> dict:
+        cycle = self.__current_cycle()
+
+        result = dict()
+        for record in cycle['calls'].get('device_status', list()):
+            for item in record['response']:
+                bright_device_status = BrightDeviceStatus(SimpleNamespace(**item))
+                result[bright_device_status.device] = bright_device_status
+
+        return result
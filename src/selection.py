@@ -0,0 +1,90 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import fnmatch
+
+from typing import Optional
+
+
+__all__ = [
+    'NODE_FILTER_KEYS',
+    'NodeSelector'
+]
+
+
+NODE_FILTER_KEYS = (
+    'IncludeCategories',
+    'ExcludeCategories',
+    'IncludeRacks',
+    'ExcludeRacks',
+    'IncludeHostnames',
+    'ExcludeHostnames',
+    'PowerStates'
+)
+
+
+class NodeSelector(object):
+    """Narrows the cluster down to the nodes worth monitoring.
+
+    Include lists keep a node when any entry matches, exclude lists drop it when any entry matches,
+    empty lists are ignored. Hostnames are matched as shell patterns (``cn*``), power states against
+    the state reported by the power control, case-insensitively.
+    """
+
+    def __init__(self, filters: dict = None):
+        self.__set_filters(filters if filters is not None else dict())
+
+    def __get_filters(self) -> dict:
+        return self.__filters
+
+    def __set_filters(self, filters: dict) -> None:
+        self.__filters = filters
+
+    def __get_filter(self, key: str) -> list:
+        return self.__get_filters().get(key, None) or list()
+
+    @property
+    def active(self) -> bool:
+        return any(self.__get_filter(key) for key in NODE_FILTER_KEYS)
+
+    @property
+    def requires_power_status(self) -> bool:
+        return bool(self.__get_filter('PowerStates'))
+
+    @staticmethod
+    def __matches(value: str, include: list, exclude: list, match=lambda value, entry: value == entry) -> bool:
+        if include and not any(match(value, entry) for entry in include):
+            return False
+        if exclude and any(match(value, entry) for entry in exclude):
+            return False
+
+        return True
+
+    def select(self, nodes: dict, power_status: Optional[dict] = None) -> dict:
+        power_states = {state.upper() for state in self.__get_filter('PowerStates')}
+
+        result = dict()
+        for unique_key, bright_node in nodes.items():
+            if not self.__matches(bright_node.category, self.__get_filter('IncludeCategories'),
+                                  self.__get_filter('ExcludeCategories')):
+                continue
+
+            if not self.__matches(bright_node.rack_name, self.__get_filter('IncludeRacks'),
+                                  self.__get_filter('ExcludeRacks')):
+                continue
+
+            if not self.__matches(bright_node.hostname, self.__get_filter('IncludeHostnames'),
+                                  self.__get_filter('ExcludeHostnames'), fnmatch.fnmatchcase):
+                continue
+
+            if power_states:
+                bright_power_status = (power_status or dict()).get(unique_key)
+                if bright_power_status is None or bright_power_status.state.upper() not in power_states:
+                    continue
+
+            result[unique_key] = bright_node
+
+        return result
@@ -0,0 +1,180 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import threading
+
+from typing import (
+    Union,
+    Tuple,
+    Iterable,
+    Optional
+)
+
+
+__all__ = [
+    'OVERFLOW_POLICY_TOP_K',
+    'OVERFLOW_POLICY_AGGREGATE',
+    'OVERFLOW_POLICIES',
+    'SeriesKeyTable',
+    'SeriesLimiter'
+]
+
+
+OVERFLOW_POLICY_TOP_K = 'TopK'
+OVERFLOW_POLICY_AGGREGATE = 'Aggregate'
+
+OVERFLOW_POLICIES = (OVERFLOW_POLICY_TOP_K, OVERFLOW_POLICY_AGGREGATE)
+
+
+class SeriesKeyTable(object):
+    """Interns (measurable, parameter) series keys into dense integer ids.
+
+    Only parameterized series count towards ``max_series``; plain measurables are always admitted.
+    The cap is first-come: once it is reached every new parameterized key is refused, regardless of
+    its values, until the table is replaced on the next cluster refresh.
+    """
+
+    def __init__(self, max_series: Optional[int] = None):
+        self.__set_max_series(max_series)
+
+        self.__keys = dict()
+        self.__fields = list()
+        self.__families = list()
+        self.__parameterized = list()
+        self.__parameterized_count = 0
+
+        self.__mutex = threading.Lock()
+
+    def __get_max_series(self) -> Optional[int]:
+        return self.__max_series
+
+    def __set_max_series(self, max_series: Optional[int]) -> None:
+        self.__max_series = max_series
+
+    def __len__(self) -> int:
+        return len(self.__fields)
+
+    @staticmethod
+    def field_name(name: str, parameter: Optional[str]) -> str:
+        if parameter:
+            return '{0}:{1}'.format(name, parameter)
+        else:
+            return name
+
+    @staticmethod
+    def overflow_field_name(family: str) -> str:
+        return '{0}:Other'.format(family)
+
+    def intern(self, name: str, parameter: Optional[str] = None) -> Optional[int]:
+        key = (name, parameter or '')
+
+        series_id = self.__keys.get(key)
+        if series_id is not None:
+            return series_id
+
+        with self.__mutex:
+            series_id = self.__keys.get(key)
+            if series_id is not None:
+                return series_id
+
+            if parameter:
+                max_series = self.__get_max_series()
+                if max_series is not None and self.__parameterized_count >= max_series:
+                    return None
+                self.__parameterized_count += 1
+
+            series_id = len(self.__fields)
+
+            self.__fields.append(self.field_name(name, parameter))
+            self.__families.append(name)
+            self.__parameterized.append(bool(parameter))
+
+            self.__keys[key] = series_id
+
+        return series_id
+
+    def field(self, series_id: int) -> str:
+        return self.__fields[series_id]
+
+    def family(self, series_id: int) -> str:
+        return self.__families[series_id]
+
+    def is_parameterized(self, series_id: int) -> bool:
+        return self.__parameterized[series_id]
+
+    def snapshot(self) -> Tuple[tuple, tuple, tuple]:
+        with self.__mutex:
+            return tuple(self.__fields), tuple(self.__families), tuple(self.__parameterized)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Tuple[tuple, tuple, tuple]) -> 'SeriesKeyTable':
+        table = cls()
+
+        for field, family, parameterized in zip(*snapshot):
+            parameter = field[len(family) + 1:] if parameterized else None
+            table.intern(family, parameter)
+
+        return table
+
+
+class SeriesLimiter(object):
+    """Bounds the number of parameterized series emitted per node.
+
+    Series beyond the cap are either dropped (``TopK`` keeps the largest values) or summed into a
+    ``<measurable>:Other`` field per measurable family (``Aggregate``).
+    """
+
+    def __init__(self, max_series_per_node: Optional[int] = None, overflow_policy: str = OVERFLOW_POLICY_TOP_K):
+        self.__set_max_series_per_node(max_series_per_node)
+        self.__set_overflow_policy(overflow_policy)
+
+    def __get_max_series_per_node(self) -> Optional[int]:
+        return self.__max_series_per_node
+
+    def __set_max_series_per_node(self, max_series_per_node: Optional[int]) -> None:
+        self.__max_series_per_node = max_series_per_node
+
+    def __get_overflow_policy(self) -> str:
+        return self.__overflow_policy
+
+    def __set_overflow_policy(self, overflow_policy: str) -> None:
+        self.__overflow_policy = overflow_policy
+
+    def limit(self, table: SeriesKeyTable, values: dict,
+              overflow: Iterable[Tuple[str, Union[int, float]]] = ()) -> Tuple[dict, int]:
+        """Returns the fields to emit for one node and the number of series not emitted individually.
+
+        ``values`` maps series ids to values, ``overflow`` holds (family, value) pairs for series the
+        key table refused to intern.
+        """
+        fields = dict()
+        parameterized = []
+
+        for series_id, value in values.items():
+            if table.is_parameterized(series_id):
+                parameterized.append((series_id, value))
+            else:
+                fields[table.field(series_id)] = value
+
+        overflow = list(overflow)
+
+        max_series_per_node = self.__get_max_series_per_node()
+        if max_series_per_node is not None and len(parameterized) > max_series_per_node:
+            parameterized.sort(key=lambda series: series[1], reverse=True)
+
+            overflow.extend((table.family(series_id), value) for series_id, value in
+                            parameterized[max_series_per_node:])
+            parameterized = parameterized[:max_series_per_node]
+
+        for series_id, value in parameterized:
+            fields[table.field(series_id)] = value
+
+        if overflow and self.__get_overflow_policy() == OVERFLOW_POLICY_AGGREGATE:
+            for family, value in overflow:
+                field = table.overflow_field_name(family)
+                fields[field] = fields.get(field, 0) + value
+
+        return fields, len(overflow)
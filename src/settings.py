@@ -0,0 +1,198 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+from typing import Optional
+
+from exceptions import InvalidConfigurationFileError
+
+from transport import DEFAULT_INGESTION_ENDPOINT
+from selection import NODE_FILTER_KEYS
+
+from series import (
+    OVERFLOW_POLICY_TOP_K,
+    OVERFLOW_POLICIES
+)
+
+from events import (
+    COLLECTION_MODE_POLL,
+    COLLECTION_MODES
+)
+
+
+__all__ = [
+    'ConnectorSettings'
+]
+
+
+class ConnectorSettings(object):
+    def __init__(self, appconfig: dict = None):
+        self.__set_appconfig(appconfig if appconfig is not None else dict())
+
+        # every setting is read once up front, so configuration errors stop the connector at launch
+        for name, attribute in vars(ConnectorSettings).items():
+            if isinstance(attribute, property):
+                getattr(self, name)
+
+    def __get_appconfig(self) -> dict:
+        return self.__appconfig
+
+    def __set_appconfig(self, appconfig: dict) -> None:
+        self.__appconfig = appconfig
+
+    def __get_optional_int(self, key: str, default: Optional[int] = None, minimum: int = 1) -> Optional[int]:
+        value = self.__get_appconfig().get(key, default)
+
+        if value is None:
+            return default
+        if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+            raise InvalidConfigurationFileError('{0} must be an integer >= {1}.'.format(key, minimum))
+
+        return value
+
+    def __get_optional_bool(self, key: str, default: bool) -> bool:
+        value = self.__get_appconfig().get(key, default)
+
+        if not isinstance(value, bool):
+            raise InvalidConfigurationFileError('{0} must be true or false.'.format(key))
+
+        return value
+
+    def __get_optional_str(self, key: str) -> Optional[str]:
+        value = self.__get_appconfig().get(key, None)
+
+        if value is not None and (not isinstance(value, str) or not value):
+            raise InvalidConfigurationFileError('{0} must be a non-empty string.'.format(key))
+
+        return value
+
+    def __get_optional_rate(self, key: str) -> Optional[float]:
+        value = self.__get_appconfig().get(key, None)
+
+        if value is None:
+            return None
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise InvalidConfigurationFileError('{0} must be a number > 0.'.format(key))
+
+        return float(value)
+
+    @property
+    def node_filters(self) -> dict:
+        value = self.__get_appconfig().get('NodeFilters', dict())
+
+        if not isinstance(value, dict) or not set(value.keys()) <= set(NODE_FILTER_KEYS):
+            raise InvalidConfigurationFileError('NodeFilters supports {0}.'.format(', '.join(NODE_FILTER_KEYS)))
+
+        for entries in value.values():
+            if not isinstance(entries, list) or not all(isinstance(entry, str) for entry in entries):
+                raise InvalidConfigurationFileError('NodeFilters entries must be lists of strings.')
+
+        return value
+
+    @property
+    def fetch_shards(self) -> int:
+        return self.__get_optional_int('FetchShards', default=1)
+
+    @property
+    def collection_mode(self) -> str:
+        value = self.__get_appconfig().get('CollectionMode', COLLECTION_MODE_POLL)
+
+        if value not in COLLECTION_MODES:
+            raise InvalidConfigurationFileError('CollectionMode must be one of {0}.'.format(
+                ', '.join(COLLECTION_MODES)))
+
+        return value
+
+    @property
+    def push_flush_interval(self) -> int:
+        return self.__get_optional_int('PushFlushInterval', default=10)
+
+    @property
+    def fetch_planning(self) -> bool:
+        return self.__get_optional_bool('FetchPlanning', default=False)
+
+    @property
+    def sender_workers(self) -> int:
+        return self.__get_optional_int('SenderWorkers', default=4)
+
+    @property
+    def pipeline_queue_size(self) -> int:
+        return self.__get_optional_int('PipelineQueueSize', default=64)
+
+    @property
+    def transform_workers(self) -> int:
+        return self.__get_optional_int('TransformWorkers', default=0, minimum=0)
+
+    @property
+    def transform_chunk_size(self) -> int:
+        return self.__get_optional_int('TransformChunkSize', default=256)
+
+    @property
+    def ingestion_endpoint(self) -> str:
+        value = self.__get_appconfig().get('IngestionEndpoint', DEFAULT_INGESTION_ENDPOINT)
+
+        if not isinstance(value, str) or not value:
+            raise InvalidConfigurationFileError('IngestionEndpoint must be a non-empty string.')
+
+        return value
+
+    @property
+    def ingestion_compression(self) -> bool:
+        return self.__get_optional_bool('IngestionCompression', default=True)
+
+    @property
+    def ingestion_items_per_second(self) -> Optional[float]:
+        return self.__get_optional_rate('IngestionItemsPerSecond')
+
+    @property
+    def ingestion_bytes_per_second(self) -> Optional[float]:
+        return self.__get_optional_rate('IngestionBytesPerSecond')
+
+    @property
+    def deferred_queue_size(self) -> int:
+        return self.__get_optional_int('DeferredQueueSize', default=1024, minimum=0)
+
+    @property
+    def record_file(self) -> Optional[str]:
+        return self.__get_optional_str('RecordFile')
+
+    @property
+    def replay_file(self) -> Optional[str]:
+        return self.__get_optional_str('ReplayFile')
+
+    @property
+    def replay_speed(self) -> float:
+        value = self.__get_appconfig().get('ReplaySpeed', 1.0)
+
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise InvalidConfigurationFileError('ReplaySpeed must be a number >= 0.')
+
+        return float(value)
+
+    @property
+    def profile_cycles(self) -> int:
+        return self.__get_optional_int('ProfileCycles', default=3)
+
+    @property
+    def profile_top(self) -> int:
+        return self.__get_optional_int('ProfileTop', default=25)
+
+    @property
+    def max_series_per_node(self) -> Optional[int]:
+        return self.__get_optional_int('MaxSeriesPerNode', minimum=0)
+
+    @property
+    def max_series_total(self) -> Optional[int]:
+        return self.__get_optional_int('MaxSeriesTotal', minimum=0)
+
+    @property
+    def series_overflow_policy(self) -> str:
+        value = self.__get_appconfig().get('SeriesOverflowPolicy', OVERFLOW_POLICY_TOP_K)
+
+        if value not in OVERFLOW_POLICIES:
+            raise InvalidConfigurationFileError('SeriesOverflowPolicy must be one of {0}.'.format(
+                ', '.join(OVERFLOW_POLICIES)))
+
+        return value
@@ -0,0 +1,37 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+from typing import (
+    Iterator,
+    Optional
+)
+
+
+__all__ = [
+    'stream_monitoring_data'
+]
+
+
+def stream_monitoring_data(bright_cluster, nodes: dict, measurables: dict, interval: int, chunk_size: int,
+                           oldest_samples: Optional[dict] = None) -> Iterator[tuple]:
+    """Yields (node, monitoring items) for every node, requesting ``chunk_size`` nodes at a time.
+
+    Only the response of the current chunk is held, every node's items are handed out and let go of
+    as soon as the node is reached, so memory depends on the chunk size rather than the cluster size.
+    """
+    items = list(nodes.items())
+
+    for index in range(0, len(items), chunk_size):
+        chunk = dict(items[index:index + chunk_size])
+
+        monitoring_data = dict()
+        if measurables:
+            monitoring_data = bright_cluster.get_monitoring_data(chunk, measurables, interval, oldest_samples)
+
+        for unique_key, bright_node in chunk.items():
+            yield bright_node, monitoring_data.pop(unique_key, list())
+
+        del monitoring_data
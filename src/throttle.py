@@ -0,0 +1,204 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import time
+import threading
+
+from typing import Optional
+
+
+__all__ = [
+    'PRIORITY_CRITICAL',
+    'PRIORITY_HIGH',
+    'PRIORITY_NORMAL',
+    'PRIORITY_LOW',
+    'PRIORITIES',
+    'split_by_priority',
+    'TokenBucket',
+    'IngestionThrottle'
+]
+
+
+PRIORITY_CRITICAL = 'critical'
+PRIORITY_HIGH = 'high'
+PRIORITY_NORMAL = 'normal'
+PRIORITY_LOW = 'low'
+
+# most important first
+PRIORITIES = (PRIORITY_CRITICAL, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+# share of the buckets each priority has to leave untouched and how long it may wait for tokens, in seconds
+_ADMISSION = {
+    PRIORITY_CRITICAL: (0.0, 30.0),
+    PRIORITY_HIGH: (0.1, 5.0),
+    PRIORITY_NORMAL: (0.25, 1.0),
+    PRIORITY_LOW: (0.5, 0.0)
+}
+
+_MINIMUM_RATE_FACTOR = 0.05
+_RATE_FACTOR_RECOVERY = 0.02
+
+
+def split_by_priority(node_metric_data: dict, metric_priorities: dict,
+                      header_fields: tuple = ('Hostname', 'RackId')) -> list:
+    """Splits a node record into one record per priority class, most important first.
+
+    Series fields (``<Metric>:<Parameter>``) take the priority of their metric, every record keeps
+    the header fields so it can be attributed to its node on its own.
+    """
+    headers = {field: node_metric_data[field] for field in header_fields if field in node_metric_data}
+
+    records = dict()
+    for field, value in node_metric_data.items():
+        if field in headers:
+            continue
+
+        priority = metric_priorities.get(field, metric_priorities.get(field.split(':', 1)[0], PRIORITY_NORMAL))
+        records.setdefault(priority, dict(headers))[field] = value
+
+    # nodes without any data are still reported
+    if not records:
+        records[PRIORITY_NORMAL] = headers
+
+    return [(priority, records[priority]) for priority in PRIORITIES if priority in records]
+
+
+class TokenBucket(object):
+    """Not thread-safe on its own, IngestionThrottle serializes access."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.__set_base_rate(rate)
+        self.__set_rate(rate)
+        self.__set_capacity(capacity if capacity is not None else rate)
+
+        self.__tokens = self.__get_capacity()
+        self.__updated_at = time.monotonic()
+
+    def __get_base_rate(self) -> float:
+        return self.__base_rate
+
+    def __set_base_rate(self, base_rate: float) -> None:
+        self.__base_rate = base_rate
+
+    def __get_rate(self) -> float:
+        return self.__rate
+
+    def __set_rate(self, rate: float) -> None:
+        self.__rate = rate
+
+    def __get_capacity(self) -> float:
+        return self.__capacity
+
+    def __set_capacity(self, capacity: float) -> None:
+        self.__capacity = capacity
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+
+        self.__tokens = min(self.__get_capacity(), self.__tokens + (now - self.__updated_at) * self.__get_rate())
+        self.__updated_at = now
+
+    def scale(self, factor: float) -> None:
+        self.__refill()
+        self.__set_rate(self.__get_base_rate() * factor)
+
+    def admits(self, amount: float, reserve: float = 0.0) -> bool:
+        self.__refill()
+
+        # anything larger than the bucket is admitted once the bucket is full, it would starve otherwise
+        amount = min(amount, self.__get_capacity() * (1.0 - reserve))
+
+        return self.__tokens - amount >= reserve * self.__get_capacity()
+
+    def take(self, amount: float) -> None:
+        self.__tokens -= min(amount, self.__get_capacity())
+
+
+class IngestionThrottle(object):
+    """Token buckets for items and bytes per second in front of the ingestion endpoint.
+
+    Lower priorities must leave part of the buckets untouched and give up sooner, so under pressure
+    critical telemetry keeps flowing while low priority telemetry is turned away. Throttling
+    responses halve the rates, every successful send recovers a little of them.
+    """
+
+    def __init__(self, items_per_second: Optional[float] = None, bytes_per_second: Optional[float] = None):
+        buckets = []
+        if items_per_second is not None:
+            buckets.append(('items', TokenBucket(items_per_second)))
+        if bytes_per_second is not None:
+            buckets.append(('bytes', TokenBucket(bytes_per_second)))
+        self.__set_buckets(buckets)
+
+        self.__rate_factor = 1.0
+        self.__counters = dict()
+
+        self.__mutex = threading.Lock()
+
+    def __get_buckets(self) -> list:
+        return self.__buckets
+
+    def __set_buckets(self, buckets: list) -> None:
+        self.__buckets = buckets
+
+    def __try_acquire(self, items: int, size: int, reserve: float) -> bool:
+        amounts = {'items': items, 'bytes': size}
+
+        with self.__mutex:
+            buckets = self.__get_buckets()
+
+            if not all(bucket.admits(amounts[unit], reserve) for unit, bucket in buckets):
+                return False
+
+            for unit, bucket in buckets:
+                bucket.take(amounts[unit])
+
+        return True
+
+    def acquire(self, priority: str, items: int, size: int) -> bool:
+        reserve, max_wait = _ADMISSION[priority]
+        give_up_at = time.monotonic() + max_wait
+
+        while not self.__try_acquire(items, size, reserve):
+            if time.monotonic() >= give_up_at:
+                return False
+            time.sleep(0.05)
+
+        return True
+
+    def try_acquire(self, priority: str, items: int, size: int) -> bool:
+        reserve, _ = _ADMISSION[priority]
+        return self.__try_acquire(items, size, reserve)
+
+    def __scale(self, rate_factor: float) -> None:
+        self.__rate_factor = rate_factor
+
+        for _, bucket in self.__get_buckets():
+            bucket.scale(rate_factor)
+
+    def throttled(self) -> None:
+        with self.__mutex:
+            self.__scale(max(_MINIMUM_RATE_FACTOR, self.__rate_factor / 2))
+
+    def succeeded(self) -> None:
+        with self.__mutex:
+            if self.__rate_factor < 1.0:
+                self.__scale(min(1.0, self.__rate_factor + _RATE_FACTOR_RECOVERY))
+
+    def count(self, priority: str, outcome: str, items: int = 1) -> None:
+        with self.__mutex:
+            key = (priority, outcome)
+            self.__counters[key] = self.__counters.get(key, 0) + items
+
+    def drain_counters(self) -> dict:
+        with self.__mutex:
+            counters, self.__counters = self.__counters, dict()
+
+        return counters
+
+    @property
+    def rate_factor(self) -> float:
+        return self.__rate_factor
@@ -0,0 +1,299 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import os
+import gzip
+import json
+import pickle
+import shutil
+import struct
+import tempfile
+import multiprocessing
+
+from typing import (
+    Tuple,
+    Iterable,
+    Optional
+)
+
+from series import (
+    SeriesKeyTable,
+    SeriesLimiter
+)
+
+from transport import create_message_envelope
+from values import normalize_monitoring_value
+from throttle import split_by_priority
+
+
+__all__ = [
+    'MONITORING_ITEM',
+    'create_node_record',
+    'pack_monitoring_items',
+    'transform_chunk',
+    'TransformWorkerPool'
+]
+
+
+# entity, measurable, t1, value, value type
+MONITORING_ITEM = struct.Struct('<qqqdB')
+
+# number of packed items, followed by the items and the json list of the strings they refer to
+_PACKED_HEADER = struct.Struct('<I')
+
+# raw values are packed as they are and only normalized in the workers, strings by their index
+_VALUE_FLOAT = 0
+_VALUE_INT = 1
+_VALUE_BOOL = 2
+_VALUE_STRING = 3
+
+_VALUE_TYPES = {
+    float: _VALUE_FLOAT,
+    int: _VALUE_INT,
+    bool: _VALUE_BOOL,
+    str: _VALUE_STRING
+}
+
+_COMPRESSION_LEVEL = 6
+
+# (cycle, series table, series limiter) of the last context seen by this worker process
+_cached_context = [None, None, None]
+
+# directory the pool publishes cycle contexts to and the (cycle, context) last loaded from it
+_context_directory = [None]
+_published_context = [None, None]
+
+
+def pack_monitoring_items(items: Iterable[dict]) -> bytes:
+    """Packs raw monitoring items into fixed size records, dropping the ones without a value to emit.
+
+    Values are packed raw with their type, normalizing them is left to ``transform_chunk`` so the
+    fetching threads do as little per item as possible.
+    """
+    pack = MONITORING_ITEM.pack
+
+    records = []
+    strings = dict()
+    for item in items:
+        entity = item.get('entity', None)
+        measurable = item.get('measurable', None)
+        value = item.get('value', None)
+
+        value_type = _VALUE_TYPES.get(type(value))
+        if entity is None or measurable is None or value_type is None:
+            continue
+
+        if value_type == _VALUE_STRING:
+            value = strings.setdefault(value, len(strings))
+
+        records.append(pack(entity, measurable, item.get('t1', 0), value, value_type))
+
+    return _PACKED_HEADER.pack(len(records)) + b''.join(records) + json.dumps(list(strings)).encode('utf-8')
+
+
+def _unpack_monitoring_items(buffer: bytes) -> Iterable[tuple]:
+    """Yields (entity, measurable, t1, normalized value) for every packed item with an emittable value."""
+    count, = _PACKED_HEADER.unpack_from(buffer)
+    end = _PACKED_HEADER.size + count * MONITORING_ITEM.size
+
+    strings = json.loads(bytes(buffer[end:]).decode('utf-8'))
+
+    for entity, measurable, t1, value, value_type in MONITORING_ITEM.iter_unpack(
+            memoryview(buffer)[_PACKED_HEADER.size:end]):
+        if value_type == _VALUE_INT:
+            value = int(value)
+        elif value_type == _VALUE_BOOL:
+            value = normalize_monitoring_value(bool(value))
+        elif value_type == _VALUE_STRING:
+            value = normalize_monitoring_value(strings[int(value)])
+
+            if value is None:
+                continue
+
+        yield entity, measurable, t1, value
+
+
+def _get_series(cycle: int, snapshot: tuple, max_series_per_node: Optional[int],
+                overflow_policy: str) -> Tuple[SeriesKeyTable, SeriesLimiter]:
+    if _cached_context[0] != cycle:
+        _cached_context[:] = [
+            cycle,
+            SeriesKeyTable.from_snapshot(snapshot),
+            SeriesLimiter(max_series_per_node, overflow_policy)
+        ]
+
+    return _cached_context[1], _cached_context[2]
+
+
+def create_node_record(bright_node, monitoring_items: Iterable, measurables: dict, series_ids: dict,
+                       series_table: SeriesKeyTable, series_limiter: SeriesLimiter) -> Tuple[dict, int]:
+    """Builds the record of one node from its wrapped monitoring items, as sent when ``TransformWorkers`` is 0.
+
+    Returns the record and the number of series that exceeded cardinality limits.
+    """
+    node_metric_data = dict()
+
+    node_metric_data['Hostname'] = bright_node.hostname
+    node_metric_data['RackId'] = bright_node.rack_id  # rack id will NA for non bare metal clusters
+
+    series_values = dict()
+    series_overflow = list()
+
+    for monitoring_item in monitoring_items:
+        # filtering out invalid metrics
+        if monitoring_item.value is None or monitoring_item.measurable is None:
+            continue
+
+        measurable = measurables.get(monitoring_item.measurable)
+
+        # filtering out invalid metrics
+        if measurable is None:
+            continue
+        if measurable.name is None or measurable.type is None:
+            continue
+
+        series_id = series_ids.get(monitoring_item.measurable)
+
+        if series_id is None:
+            series_overflow.append((measurable.name, monitoring_item.value))
+        else:
+            series_values[series_id] = monitoring_item.value
+
+    series_fields, overflow_count = series_limiter.limit(series_table, series_values, series_overflow)
+    node_metric_data.update(series_fields)
+
+    return node_metric_data, overflow_count
+
+
+def transform_chunk(context: tuple, headers: tuple, buffer: bytes) -> Tuple[list, int]:
+    """Builds gzipped batches of message envelopes for one chunk of nodes, one batch per priority.
+
+    ``headers`` holds a (unique key, hostname, rack id) triple per node and ``buffer`` the packed
+    monitoring items of those nodes. Returns (priority, payload, number of records) triples and the
+    number of series that exceeded cardinality limits.
+    """
+    (cycle, cutoff, instrumentation_key, timestamp, snapshot, measurable_series, max_series_per_node,
+     overflow_policy, metric_priorities) = context
+
+    series_table, series_limiter = _get_series(cycle, snapshot, max_series_per_node, overflow_policy)
+
+    grouped = dict()
+    for entity, measurable, t1, value in _unpack_monitoring_items(buffer):
+        if t1 < cutoff:
+            continue
+
+        series = measurable_series.get(measurable)
+        if series is None:
+            continue
+
+        series_id, family = series
+        series_values, series_overflow = grouped.setdefault(entity, (dict(), list()))
+
+        if series_id is None:
+            series_overflow.append((family, value))
+        else:
+            series_values[series_id] = value
+
+    lines = dict()
+    overflowed_series = 0
+
+    for unique_key, hostname, rack_id in headers:
+        node_metric_data = dict()
+
+        node_metric_data['Hostname'] = hostname
+        node_metric_data['RackId'] = rack_id
+
+        series_values, series_overflow = grouped.get(unique_key, (dict(), list()))
+
+        series_fields, overflow_count = series_limiter.limit(series_table, series_values, series_overflow)
+        node_metric_data.update(series_fields)
+        overflowed_series += overflow_count
+
+        for priority, record in split_by_priority(node_metric_data, metric_priorities):
+            envelope = create_message_envelope(instrumentation_key, json.dumps(record), timestamp)
+            lines.setdefault(priority, list()).append(envelope)
+
+    batches = [
+        (priority, gzip.compress('\n'.join(envelopes).encode('utf-8'), _COMPRESSION_LEVEL), len(envelopes))
+        for priority, envelopes in lines.items()
+    ]
+
+    return batches, overflowed_series
+
+
+def _context_filepath(cycle: int) -> str:
+    return os.path.join(_context_directory[0], '{0}.context'.format(cycle))
+
+
+def _initialize_worker(context_directory: str) -> None:
+    _context_directory[0] = context_directory
+
+
+def _transform_published_chunk(cycle: int, headers: tuple, buffer: bytes) -> Tuple[list, int]:
+    # every worker loads the context of a cycle once, tasks only carry the headers and the packed items
+    if _published_context[0] != cycle:
+        with open(_context_filepath(cycle), 'rb') as file_pointer:
+            _published_context[:] = [cycle, pickle.load(file_pointer)]
+
+    return transform_chunk(_published_context[1], headers, buffer)
+
+
+class TransformWorkerPool(object):
+    """Process pool running ``transform_chunk`` outside of the emitting process.
+
+    The context of a cycle is published once through a file the workers load on their first task of
+    that cycle, so tasks themselves are just the node headers and a packed item buffer.
+    """
+
+    def __init__(self, workers: int):
+        self.__set_context_directory(tempfile.mkdtemp(prefix='transform-'))
+
+        # forkserver keeps the sender and fetch threads of this process out of the workers
+        context = multiprocessing.get_context('forkserver')
+        self.__set_pool(context.Pool(workers, initializer=_initialize_worker,
+                                     initargs=(self.__get_context_directory(),)))
+
+    def __get_pool(self):
+        return self.__pool
+
+    def __set_pool(self, pool) -> None:
+        self.__pool = pool
+
+    def __get_context_directory(self) -> str:
+        return self.__context_directory
+
+    def __set_context_directory(self, context_directory: str) -> None:
+        self.__context_directory = context_directory
+
+    def publish(self, context: tuple) -> None:
+        """Makes ``context`` the one of its cycle, cycles of the pool must not overlap."""
+        context_directory = self.__get_context_directory()
+
+        filename = '{0}.context'.format(context[0])
+        filepath = os.path.join(context_directory, filename)
+
+        with open(filepath + '.tmp', 'wb') as file_pointer:
+            pickle.dump(context, file_pointer, pickle.HIGHEST_PROTOCOL)
+        os.replace(filepath + '.tmp', filepath)
+
+        for previous in os.listdir(context_directory):
+            if previous != filename:
+                os.remove(os.path.join(context_directory, previous))
+
+    def submit(self, cycle: int, headers: tuple, buffer: bytes):
+        pool = self.__get_pool()
+        return pool.apply_async(_transform_published_chunk, (cycle, headers, buffer))
+
+    def close(self, terminate: bool = False) -> None:
+        """Stops the workers, ``terminate`` abandons unfinished tasks instead of waiting for them."""
+        pool = self.__get_pool()
+        if terminate:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+
+        shutil.rmtree(self.__get_context_directory(), ignore_errors=True)
@@ -0,0 +1,309 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import gzip
+import json
+import time
+import queue
+import datetime
+import threading
+import http.client
+import email.utils
+import urllib.parse
+
+from typing import (
+    Tuple,
+    Iterable,
+    Optional
+)
+
+from exceptions import (
+    IngestionTransportError,
+    IngestionUnavailableError,
+    IngestionPartialDeliveryError
+)
+from throttle import IngestionThrottle
+
+
+__all__ = [
+    'DEFAULT_INGESTION_ENDPOINT',
+    'create_message_envelope',
+    'IngestionTransport'
+]
+
+
+DEFAULT_INGESTION_ENDPOINT = r'https://dc.services.visualstudio.com/v2/track'
+
+# severity level used by the logging handler for INFO records
+_SEVERITY_INFORMATION = 1
+
+# 439 is returned by the ingestion endpoint once the daily quota is exhausted
+_THROTTLED_STATUSES = {429, 439, 503}
+
+# statuses of single items in a partially accepted batch that are throttled or transient and worth retrying
+_RETRIABLE_ITEM_STATUSES = {408, 429, 500, 503}
+
+
+def create_message_envelope(instrumentation_key: str, message: str, timestamp: Optional[float] = None) -> str:
+    if timestamp is None:
+        moment = datetime.datetime.utcnow()
+    else:
+        moment = datetime.datetime.utcfromtimestamp(timestamp)
+
+    envelope = {
+        'ver': 1,
+        'name': 'Microsoft.ApplicationInsights.Message',
+        'time': moment.isoformat() + 'Z',
+        'sampleRate': 100.0,
+        'iKey': instrumentation_key,
+        'data': {
+            'baseType': 'MessageData',
+            'baseData': {
+                'ver': 2,
+                'message': message,
+                'severityLevel': _SEVERITY_INFORMATION
+            }
+        }
+    }
+
+    return json.dumps(envelope)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _retriable_items(body: bytes) -> dict:
+    """Maps the line index of every item a partial success response asks to retry to its status."""
+    try:
+        errors = json.loads(body.decode('utf-8')).get('errors', list())
+    except (ValueError, AttributeError):
+        return dict()
+
+    return {
+        error['index']: error['statusCode']
+        for error in errors
+        if isinstance(error, dict) and isinstance(error.get('index'), int) and
+        error.get('statusCode') in _RETRIABLE_ITEM_STATUSES
+    }
+
+
+def _select_lines(payload: bytes, content_encoding: Optional[str], indexes: Iterable[int]) -> bytes:
+    lines = (gzip.decompress(payload) if content_encoding == 'gzip' else payload).split(b'\n')
+    selected = b'\n'.join(lines[index] for index in sorted(indexes) if index < len(lines))
+
+    return gzip.compress(selected, 6) if content_encoding == 'gzip' else selected
+
+
+class IngestionTransport(object):
+    """Posts newline delimited telemetry envelopes to the Application Insights ingestion endpoint.
+
+    Up to ``pool_size`` HTTP/1.1 connections are kept alive and reused across sends and emit cycles,
+    so the TLS handshake is paid once per connection rather than once per batch. Throttled sends
+    wait for the ``Retry-After`` period announced by the endpoint and are retried ``max_retries``
+    times; the wait applies to every sender sharing the transport. Items a partially accepted batch
+    turned away as throttled or transient are retried the same way, on their own. The outcome of every
+    send is reported to ``throttle`` so it can adapt its rates.
+    """
+
+    def __init__(self, endpoint: str = DEFAULT_INGESTION_ENDPOINT, pool_size: int = 4, compress: bool = True,
+                 max_retries: int = 3, timeout: float = 30.0, throttle: IngestionThrottle = None):
+        self.__set_endpoint(urllib.parse.urlsplit(endpoint))
+        self.__set_compress(compress)
+        self.__set_max_retries(max_retries)
+        self.__set_timeout(timeout)
+        self.__set_throttle(throttle)
+
+        self.__connections = queue.LifoQueue(maxsize=pool_size)
+        self.__blocked_until = 0.0
+
+        self.__connections_opened = 0
+        self.__requests_sent = 0
+
+        self.__mutex = threading.Lock()
+
+    def __get_endpoint(self) -> urllib.parse.SplitResult:
+        return self.__endpoint
+
+    def __set_endpoint(self, endpoint: urllib.parse.SplitResult) -> None:
+        if endpoint.scheme not in {'http', 'https'} or not endpoint.hostname:
+            raise IngestionTransportError('Ingestion endpoint must be an http or https url')
+
+        self.__endpoint = endpoint
+
+    def __get_compress(self) -> bool:
+        return self.__compress
+
+    def __set_compress(self, compress: bool) -> None:
+        self.__compress = compress
+
+    def __get_max_retries(self) -> int:
+        return self.__max_retries
+
+    def __set_max_retries(self, max_retries: int) -> None:
+        self.__max_retries = max_retries
+
+    def __get_timeout(self) -> float:
+        return self.__timeout
+
+    def __set_timeout(self, timeout: float) -> None:
+        self.__timeout = timeout
+
+    def __get_throttle(self) -> Optional[IngestionThrottle]:
+        return self.__throttle
+
+    def __set_throttle(self, throttle: Optional[IngestionThrottle]) -> None:
+        self.__throttle = throttle
+
+    @property
+    def connections_opened(self) -> int:
+        return self.__connections_opened
+
+    @property
+    def requests_sent(self) -> int:
+        return self.__requests_sent
+
+    def __open_connection(self) -> http.client.HTTPConnection:
+        endpoint = self.__get_endpoint()
+
+        if endpoint.scheme == 'https':
+            connection = http.client.HTTPSConnection(endpoint.hostname, endpoint.port, timeout=self.__get_timeout())
+        else:
+            connection = http.client.HTTPConnection(endpoint.hostname, endpoint.port, timeout=self.__get_timeout())
+
+        with self.__mutex:
+            self.__connections_opened += 1
+
+        return connection
+
+    def __acquire_connection(self) -> http.client.HTTPConnection:
+        try:
+            return self.__connections.get_nowait()
+        except queue.Empty:
+            return self.__open_connection()
+
+    def __release_connection(self, connection: http.client.HTTPConnection) -> None:
+        try:
+            self.__connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def __wait_until_unblocked(self) -> None:
+        delay = self.__blocked_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def __block_for(self, delay: float) -> None:
+        with self.__mutex:
+            self.__blocked_until = max(self.__blocked_until, time.time() + delay)
+
+    def __post(self, body: bytes, headers: dict) -> Tuple[http.client.HTTPResponse, bytes]:
+        path = self.__get_endpoint().path or '/'
+
+        # an idle pooled connection may have been closed by the server, retry those once on a fresh one
+        for attempt in range(2):
+            connection = self.__acquire_connection() if attempt == 0 else self.__open_connection()
+
+            try:
+                connection.request('POST', path, body=body, headers=headers)
+                response = connection.getresponse()
+                response_body = response.read()
+            except (http.client.HTTPException, OSError) as ex:
+                connection.close()
+
+                if attempt == 0 and isinstance(ex, (http.client.RemoteDisconnected, ConnectionResetError,
+                                                    BrokenPipeError)):
+                    continue
+                raise IngestionUnavailableError('Unable to reach ingestion endpoint: {0}'.format(ex))
+
+            with self.__mutex:
+                self.__requests_sent += 1
+
+            if response.will_close:
+                connection.close()
+            else:
+                self.__release_connection(connection)
+
+            return response, response_body
+
+    def encode(self, payload: bytes, content_encoding: Optional[str] = None) -> Tuple[bytes, Optional[str]]:
+        """Returns the request body ``send`` posts for ``payload`` and its content encoding."""
+        if content_encoding is None and self.__get_compress():
+            return gzip.compress(payload, 6), 'gzip'
+        else:
+            return payload, content_encoding
+
+    def send(self, payload: bytes, content_encoding: Optional[str] = None) -> None:
+        headers = {
+            'Content-Type': 'application/x-json-stream',
+            'Connection': 'keep-alive'
+        }
+
+        payload, content_encoding = self.encode(payload, content_encoding)
+
+        if content_encoding is not None:
+            headers['Content-Encoding'] = content_encoding
+
+        # number of items left once part of the batch was accepted, the payload only holds those then
+        remaining = None
+
+        try:
+            for attempt in range(self.__get_max_retries() + 1):
+                self.__wait_until_unblocked()
+
+                response, response_body = self.__post(payload, headers)
+                throttle = self.__get_throttle()
+
+                # 206 means part of the batch was accepted, throttled or transient items are retried on their own
+                retriable = _retriable_items(response_body) if response.status == 206 else dict()
+
+                if response.status in {200, 206} and not retriable:
+                    if throttle is not None:
+                        throttle.succeeded()
+                    return
+
+                # server errors may go away, anything else is a problem with the payload itself
+                if response.status >= 500 and response.status not in _THROTTLED_STATUSES:
+                    raise IngestionUnavailableError('Ingestion endpoint returned {0}'.format(response.status))
+                if response.status not in _THROTTLED_STATUSES and not retriable:
+                    raise IngestionTransportError('Ingestion endpoint returned {0}'.format(response.status))
+
+                if retriable:
+                    payload = _select_lines(payload, content_encoding, retriable.keys())
+                    remaining = len(retriable)
+
+                if throttle is not None and (not retriable or 429 in retriable.values()):
+                    throttle.throttled()
+
+                retry_after = _parse_retry_after(response.getheader('Retry-After'))
+                self.__block_for(retry_after if retry_after is not None else 2 ** attempt)
+
+            raise IngestionUnavailableError('Ingestion endpoint kept throttling after {0} retries'.format(
+                self.__get_max_retries()))
+        except IngestionUnavailableError as ex:
+            # the accepted part of the batch must not be sent again
+            if remaining is None:
+                raise
+            raise IngestionPartialDeliveryError('{0}, {1} items left'.format(ex, remaining),
+                                                payload=payload, items=remaining)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.__connections.get_nowait().close()
+            except queue.Empty:
+                break
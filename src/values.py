@@ -0,0 +1,37 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+from typing import (
+    Union,
+    Optional
+)
+
+
+__all__ = [
+    'normalize_monitoring_value'
+]
+
+
+def normalize_monitoring_value(value) -> Optional[Union[int, float]]:
+    """Maps a raw monitoring value to a number, None for values that can not be emitted.
+
+    Kept free of pythoncm so transform worker processes share it with BrightEntityMonitoringItem.
+    """
+    if isinstance(value, bool):
+        return 1 if value else 0
+    elif isinstance(value, str):
+        value = value.upper()
+
+        if value in {'PASS', 'TRUE', 'ON', 'UP'}:
+            return 1
+        elif value in {'FAIL', 'FALSE', 'OFF', 'DOWN'}:
+            return 0
+        else:
+            return None
+    elif isinstance(value, int) or isinstance(value, float):
+        return value
+    else:
+        return None
@@ -0,0 +1,70 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from events import (  # noqa: E402
+    LocalEventSource,
+    PushCollector
+)
+
+
+def _item(entity: int, measurable: int, t1: int, value: float = 1.0) -> dict:
+    return {'entity': entity, 'measurable': measurable, 't1': t1, 'value': value}
+
+
+class PushCollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.source = LocalEventSource()
+        self.collector = PushCollector()
+        self.collector.attach(self.source)
+
+    def test_drained_samples_are_polled_until_acknowledged(self):
+        self.source.publish([_item(1, 100, 10), _item(2, 100, 10)])
+
+        drained = self.collector.drain()
+        self.assertEqual({1: [_item(1, 100, 10)], 2: [_item(2, 100, 10)]}, drained)
+
+        # sending may still fail, the poll must not leave drained samples out yet
+        self.assertFalse(self.collector.delivered(1, 100, 10))
+        self.assertFalse(self.collector.delivered(2, 100, 10))
+
+        # only the node sent in full is acknowledged
+        self.collector.acknowledge({1: drained[1]})
+
+        self.assertTrue(self.collector.delivered(1, 100, 10))
+        self.assertTrue(self.collector.delivered(1, 100, 9))
+        self.assertFalse(self.collector.delivered(1, 100, 11))
+        self.assertFalse(self.collector.delivered(2, 100, 10))
+
+    def test_delivered_samples_are_not_collected_again(self):
+        self.source.publish([_item(1, 100, 10)])
+        self.collector.acknowledge(self.collector.drain())
+
+        self.source.publish([_item(1, 100, 10), _item(1, 100, 20, value=2.0)])
+
+        self.assertEqual({1: [_item(1, 100, 20, value=2.0)]}, self.collector.drain())
+        self.assertEqual(dict(), self.collector.drain())
+
+    def test_attach_moves_to_the_new_source(self):
+        source = LocalEventSource()
+        self.collector.attach(source)
+
+        self.assertFalse(self.source.has_listeners())
+        self.assertTrue(source.has_listeners())
+
+        self.source.publish([_item(1, 100, 10)])
+        source.publish([_item(2, 100, 10)])
+
+        self.assertEqual({2: [_item(2, 100, 10)]}, self.collector.drain())
+
+
+if __name__ == '__main__':
+    unittest.main()